@@ -1,4 +1,8 @@
 from aiogram import Bot
 from config import API_TOKEN
+from utils.rate_limiter import outbound_scheduler
 
-bot = Bot(token=API_TOKEN)
\ No newline at end of file
+# Единственный экземпляр бота: все исходящие запросы проходят через
+# планировщик с лимитами Telegram
+bot = Bot(token=API_TOKEN)
+bot.session.middleware(outbound_scheduler)
@@ -5,5 +5,66 @@ API_TOKEN = '7648182943:AAFUB5DHLaoX0yZI2PeEjaEyyJPe7VM54pQ'
 TOKEN=os.getenv("7648182943:AAFUB5DHLaoX0yZI2PeEjaEyyJPe7VM54pQ")
 FEEDBACK_FILE = "data/feedback/feedback.json"
 TRAINING_DATA_FILE = "data/training_data.json"
+LOCATIONS_FILE = "data/locations.json"
 USER_DATA_PATH = "data/users/"
-CHANNEL_ID = -1002205385109  
\ No newline at end of file
+CHANNEL_ID = -1002205385109  
+
+# Максимальное число профилей в кэше utils.json_utils
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "512"))
+# Число потоков для файлового ввода-вывода (async-обёртки в utils.json_utils)
+IO_THREADS = int(os.getenv("IO_THREADS", "4"))
+# Хранилище профилей: "json" (data/users/user_<id>.json) или "sqlite"
+USER_STORAGE = os.getenv("USER_STORAGE", "json")
+USER_DB_FILE = os.getenv("USER_DB_FILE", "data/users.sqlite3")
+# Журнал отзывов (JSON Lines, только дозапись)
+FEEDBACK_LOG_FILE = os.getenv("FEEDBACK_LOG_FILE", "data/feedback/feedback.jsonl")
+# Сколько секунд Telegram кэширует ответы на inline-запросы по локациям
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+# Число результатов на странице inline-ответа (Telegram принимает не больше 50)
+INLINE_PAGE_SIZE = min(int(os.getenv("INLINE_PAGE_SIZE", "50")), 50)
+# Постоянное хранилище FSM и интервал пакетной записи изменений, секунды
+FSM_DB_FILE = os.getenv("FSM_DB_FILE", "data/fsm.sqlite3")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+# Через сколько секунд простоя сбрасываются сессии FSM и активные аттестации,
+# и как часто это проверяется
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(6 * 60 * 60)))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+# Прогресс итоговой аттестации (номер вопроса и маска ошибок)
+ATTESTATION_DB_FILE = os.getenv("ATTESTATION_DB_FILE", "data/attestation.sqlite3")
+# Реестр file_id загруженных в Telegram изображений и видео
+MEDIA_CACHE_FILE = os.getenv("MEDIA_CACHE_FILE", "data/media_cache.json")
+# Служебный чат для предварительной загрузки медиа при старте (0 — не загружать)
+MEDIA_PREWARM_CHAT_ID = int(os.getenv("MEDIA_PREWARM_CHAT_ID", "0"))
+# Очередь исходящих изменений профилей для API сотрудников: файл базы,
+# размер пачки, интервал опроса и повторы с экспоненциальной задержкой, секунды
+OUTBOX_DB_FILE = os.getenv("OUTBOX_DB_FILE", "data/outbox.sqlite3")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "30"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "2"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "300"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "50"))
+# Лимиты исходящих сообщений Telegram (utils.rate_limiter): всего в секунду,
+# в личный чат в секунду и допустимый всплеск, в группу в секунду
+# (20 в минуту); сколько раз повторять запрос после ответа retry_after
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = int(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_RATE = float(os.getenv("TG_GROUP_RATE", str(20 / 60)))
+TG_RETRY_AFTER_ATTEMPTS = int(os.getenv("TG_RETRY_AFTER_ATTEMPTS", "3"))
+# Режим webhook вместо long polling: публичный адрес (пусто — polling), путь,
+# секрет для заголовка X-Telegram-Bot-Api-Secret-Token, адрес и порт
+# встроенного сервера, число одновременных соединений от Telegram, вызывать
+# ли setWebhook при старте (0 — для локальной проверки) и сколько секунд
+# при остановке дожидаться обработки уже принятых обновлений
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_SET_ON_START = os.getenv("WEBHOOK_SET_ON_START", "1") == "1"
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "10"))
+# Обработка апдейтов (utils.chat_dispatch): сколько апдейтов разных чатов
+# обрабатывается одновременно и сколько апдейтов одного чата может ждать очереди
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "50"))
+CHAT_QUEUE_DEPTH = int(os.getenv("CHAT_QUEUE_DEPTH", "5"))
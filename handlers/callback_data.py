@@ -0,0 +1,103 @@
+from aiogram.filters.callback_data import CallbackData
+
+# Форматы callback_data всех inline-кнопок бота. Строки совпадают с прежними
+# f-строками, поэтому кнопки в уже отправленных сообщениях продолжают работать.
+# Обработчики регистрируются через utils.callback_router.callbacks.handler(...).
+
+# Главное меню
+class ProfileCallbackData(CallbackData, prefix="profile"):
+    action: str
+
+class AssignmentsCallbackData(CallbackData, prefix="assignments"):
+    action: str
+
+class TrainingCallbackData(CallbackData, prefix="training"):
+    pass
+
+class FeedbackCallbackData(CallbackData, prefix="feedback"):
+    pass
+
+class CoursesCallbackData(CallbackData, prefix="courses"):
+    pass
+
+class MentorMenuCallbackData(CallbackData, prefix="mentor_menu"):
+    pass
+
+# Профиль
+class MenuCallbackData(CallbackData, prefix="back_to_menu"):
+    pass
+
+class EditProfileCallbackData(CallbackData, prefix="edit_profile"):
+    pass
+
+class MyAssignmentsCallbackData(CallbackData, prefix="my_assignments"):
+    pass
+
+class BackToProfileCallbackData(CallbackData, prefix="back_to_profile"):
+    pass
+
+# Регистрация
+class StartRegistrationCallbackData(CallbackData, prefix="start_registration"):
+    pass
+
+class SelectMentorCallbackData(CallbackData, prefix="select_mentor"):
+    mentor_id: int
+
+class ToggleAttractionCallbackData(CallbackData, prefix="toggle_attraction"):
+    name: str
+
+class FinishSelectionCallbackData(CallbackData, prefix="finish_selection"):
+    pass
+
+# Обучение и тесты уроков: next_<раздел>_<урок>, answer_<номер>
+class NextLessonCallbackData(CallbackData, prefix="next", sep="_"):
+    section: str
+    lesson: str
+
+class TestAnswerCallbackData(CallbackData, prefix="answer", sep="_"):
+    answer: int
+
+# Итоговая аттестация стажера
+class StartTestCallbackData(CallbackData, prefix="start_test"):
+    pass
+
+class FinalAnswerCallbackData(CallbackData, prefix="final_answer"):
+    question_index: int
+    answer: int
+
+# Меню наставника
+class TraineeDetailsCallbackData(CallbackData, prefix="trainee_details"):
+    trainee_id: str
+
+class TraineeTasksCallbackData(CallbackData, prefix="trainee_tasks"):
+    page: int
+    trainee_id: str
+
+class TaskDetailsCallbackData(CallbackData, prefix="task_details"):
+    index: int
+    trainee_id: str
+
+class TraineeProgressCallbackData(CallbackData, prefix="trainee_progress"):
+    trainee_id: str
+
+class FinalTestCallbackData(CallbackData, prefix="final_test"):
+    trainee_id: str
+
+class StartFinalTestCallbackData(CallbackData, prefix="start_final_test"):
+    trainee_id: str
+
+class PromoteCallbackData(CallbackData, prefix="promote_to_operator"):
+    trainee_id: str
+
+class ConfirmPromotionCallbackData(CallbackData, prefix="confirm_promotion"):
+    trainee_id: str
+
+# Меню руководителя
+class ManagerEmployeesCallbackData(CallbackData, prefix="manager_employees"):
+    pass
+
+class ManagerMentorsCallbackData(CallbackData, prefix="manager_mentors"):
+    pass
+
+class EmployeeDetailsCallbackData(CallbackData, prefix="employee_details"):
+    employee_id: str
@@ -1,12 +1,12 @@
-import os
-import json
 import logging
 from aiogram import Router
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from handlers.states import FeedbackStates
-from utils.json_utils import load_feedback, save_feedback
+from utils.callback_router import callbacks
+from handlers.callback_data import FeedbackCallbackData
+from utils.json_utils import save_feedback_async
 from text import FEEDBACK_PROMPT, FEEDBACK_THANK_YOU, UNKNOWN_FIRST_NAME, UNKNOWN_LAST_NAME
 
 # Настройка логирования: вывод логов только в консоль
@@ -25,21 +25,23 @@ async def ask_feedback(message: Message, state: FSMContext):
     await message.answer(FEEDBACK_PROMPT)
     await state.set_state(FeedbackStates.waiting_for_feedback)
 
+@callbacks.handler(FeedbackCallbackData)
+async def ask_feedback_button(callback: CallbackQuery, state: FSMContext):
+    """Кнопка 'Обратная связь' главного меню — то же, что /feedback."""
+    logger.info(f"Запрос отзыва от пользователя {callback.from_user.id}")
+    await callback.message.answer(FEEDBACK_PROMPT)
+    await state.set_state(FeedbackStates.waiting_for_feedback)
+    await callback.answer()
+
 @router.message(FeedbackStates.waiting_for_feedback)
-async def save_feedback_handler(message: Message, state: FSMContext):
+async def save_feedback_handler(message: Message, state: FSMContext, user_profile):
     user_id = str(message.from_user.id)
     feedback_text = message.text
-    user_file = f"data/users/user_{user_id}.json"
     logger.info(f"Получен отзыв от пользователя {user_id}: {feedback_text}")
 
-    if os.path.exists(user_file):
-        try:
-            with open(user_file, "r", encoding="utf-8") as file:
-                user_data = json.load(file)
-            logger.info(f"Файл пользователя {user_id} найден для сохранения отзыва")
-        except Exception as e:
-            logger.warning(f"Ошибка чтения файла пользователя {user_id}: {e}")
-            user_data = {}
+    user_data = user_profile
+    if user_data is not None:
+        logger.info(f"Файл пользователя {user_id} найден для сохранения отзыва")
         first_name = user_data.get("first_name", UNKNOWN_FIRST_NAME)
         last_name = user_data.get("last_name", UNKNOWN_LAST_NAME)
     else:
@@ -47,7 +49,7 @@ async def save_feedback_handler(message: Message, state: FSMContext):
         first_name = UNKNOWN_FIRST_NAME
         last_name = UNKNOWN_LAST_NAME
 
-    save_feedback(user_id, feedback_text, first_name, last_name)
+    await save_feedback_async(user_id, feedback_text, first_name, last_name)
     logger.info(f"Отзыв сохранён для пользователя {user_id}")
 
     await message.answer(FEEDBACK_THANK_YOU)
@@ -1,8 +1,8 @@
-import json
 import logging
 from aiogram import Router
-from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
-from utils.json_utils import load_locations
+from aiogram.types import InlineQuery
+from config import INLINE_CACHE_TIME, INLINE_PAGE_SIZE
+from utils.location_index import get_location_index
 from text import INLINE_QUERY_ERROR
 
 # Настройка логирования: вывод логов только в консоль
@@ -17,40 +17,19 @@ router = Router()
 
 @router.inline_query()
 async def inline_query_handler(inline_query: InlineQuery):
-    query = inline_query.query.strip().lower()
-    logger.info(f"Inline query received from user {inline_query.from_user.id}: '{query}'")
-    
-    # Загружаем актуальные данные из JSON при каждом запросе
-    locations = load_locations()
-    logger.info(f"Loaded {len(locations)} locations from JSON")
-    
-    # Фильтрация по названию, городу или адресу
-    filtered_locations = [
-        loc for loc in locations if query in loc["title"].lower() or query in loc["city"].lower() or query in loc["address"].lower()
-    ] if query else locations
-    
-    logger.info(f"Found {len(filtered_locations)} matching locations")
-    
-    if not filtered_locations:
-        await inline_query.answer([], cache_time=1)
-        logger.info("No matching locations found, returning empty result")
-        return
+    query = inline_query.query.strip()
+    logger.debug(f"Inline query received from user {inline_query.from_user.id}: '{query}'")
 
-    # Формируем текстовые результаты
-    results = [
-        InlineQueryResultArticle(
-            id=f"loc_{i}",
-            title=loc["title"],
-            description=f"{loc['city']}, {loc['address']}",
-            input_message_content=InputTextMessageContent(
-                message_text=f"{loc['title']} {loc['city']} {loc['address']}"
-            )
-        )
-        for i, loc in enumerate(filtered_locations)
-    ]
-    
     try:
-        await inline_query.answer(results, cache_time=1)
-        logger.info("Inline query results sent successfully")
+        offset = max(int(inline_query.offset or 0), 0)
+    except ValueError:
+        offset = 0
+
+    # Поиск по готовому индексу: название, город или адрес; собираем только нужную страницу
+    results, next_offset = get_location_index().find_page(query, offset, INLINE_PAGE_SIZE)
+    logger.debug(f"Found {len(results)} matching locations at offset {offset}")
+
+    try:
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
     except Exception as e:
         logger.error(f"{INLINE_QUERY_ERROR} {e}")
@@ -1,9 +1,11 @@
 import logging
-import os
-from pathlib import Path
 from aiogram import Router, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
-from utils.json_utils import load_user_data  # Импортируем функцию для работы с JSON
+from utils.json_utils import load_user_data_async, find_user_ids_async  # Импортируем функции для работы с JSON
+from utils.callback_router import callbacks
+from handlers.callback_data import (
+    ManagerEmployeesCallbackData, ManagerMentorsCallbackData, MenuCallbackData, EmployeeDetailsCallbackData
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,14 +18,14 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 @router.message(lambda message: message.text == "/manager")
-async def manager_command(message: Message):
+async def manager_command(message: Message, user_profile):
     """
     Обработчик команды /Manager для отображения меню управляющего.
     """
     user_id = message.from_user.id
 
-    # Загружаем данные пользователя
-    user_data = load_user_data(user_id)
+    # Профиль пользователя загружен UserProfileMiddleware
+    user_data = user_profile
     if not user_data or user_data.get("role") != "Manager":
         # Если пользователь не управляющий, выводим сообщение об отсутствии доступа
         await message.answer("У вас нет доступа к этой команде. Данная функция доступна только для управляющих.")
@@ -34,19 +36,19 @@ async def manager_command(message: Message):
     message_text = "Добро пожаловать в меню управляющего. Выберите нужный раздел:"
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Сотрудники", callback_data="manager_employees")],
-            [InlineKeyboardButton(text="Наставники", callback_data="manager_mentors")],
-            [InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")],
+            [InlineKeyboardButton(text="Сотрудники", callback_data=ManagerEmployeesCallbackData().pack())],
+            [InlineKeyboardButton(text="Наставники", callback_data=ManagerMentorsCallbackData().pack())],
+            [InlineKeyboardButton(text="Назад в меню", callback_data=MenuCallbackData().pack())],
         ]
     )
 
     await message.answer(message_text, reply_markup=keyboard)
 
 
-@router.callback_query(lambda c: c.data == "manager_employees")
-async def show_employees(callback: CallbackQuery):
+@callbacks.handler(ManagerEmployeesCallbackData)
+async def show_employees(callback: CallbackQuery, user_profile):
     user_id = callback.from_user.id
-    manager_data = load_user_data(user_id)
+    manager_data = user_profile
     if not manager_data or manager_data.get("role") != "Manager":
         await callback.answer("У вас нет доступа к этой функции.", show_alert=True)
         return
@@ -56,24 +58,18 @@ async def show_employees(callback: CallbackQuery):
         await callback.answer("Ошибка: ваша локация не указана в профиле.", show_alert=True)
         return
 
+    # Индекс (город, роль) вместо чтения всех профилей
     employees = []
-    users_dir = Path("data/users")
-    for file_path in users_dir.glob("user_*.json"):
-        # вынимаем id из имени файла, например из "user_12345.json" → 12345
-        try:
-            emp_id = int(file_path.stem.split("_", 1)[1])
-        except (IndexError, ValueError):
-            continue
-        if emp_id == user_id:
+    for emp_id in await find_user_ids_async(manager_city, ("Trainee", "Employee")):
+        if str(emp_id) == str(user_id):
             continue
 
-        emp_data = load_user_data(emp_id)
+        emp_data = await load_user_data_async(emp_id)
         if not emp_data:
             continue
 
-        if emp_data.get("city") == manager_city and emp_data.get("role") in ("Trainee", "Employee"):
-            full_name = f"{emp_data.get('first_name', '')} {emp_data.get('last_name', '')}".strip()
-            employees.append((full_name or "— Без имени —", emp_id))
+        full_name = f"{emp_data.get('first_name', '')} {emp_data.get('last_name', '')}".strip()
+        employees.append((full_name or "— Без имени —", emp_id))
 
     if not employees:
         await callback.message.edit_text("Нет сотрудников в вашей локации.")
@@ -82,7 +78,7 @@ async def show_employees(callback: CallbackQuery):
     # строим клавиатуру
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(name, callback_data=f"employee_details:{eid}")]
+            [InlineKeyboardButton(text=name, callback_data=EmployeeDetailsCallbackData(employee_id=str(eid)).pack())]
             for name, eid in employees
         ]
     )
@@ -2,31 +2,49 @@ import logging
 from datetime import datetime, timedelta
 from aiogram import Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from utils.json_utils import load_from_json, save_user_data
+from utils.json_utils import load_from_json_async, update_user_data_async, user_lock, get_trainee_ids_async
 from bot_instance import bot  
+from utils.rate_limiter import outbound_priority, NOTIFICATION
+from utils.callback_router import callbacks
+from handlers.callback_data import (
+    TraineeDetailsCallbackData, TraineeTasksCallbackData, TaskDetailsCallbackData, TraineeProgressCallbackData,
+    FinalTestCallbackData, StartFinalTestCallbackData, PromoteCallbackData, ConfirmPromotionCallbackData
+)
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 TASKS_PER_PAGE = 5  # Количество заданий на одной странице
 
+async def load_trainees(mentor_id, mentor_data):
+    """
+    Возвращает {id стажера: данные} по индексу наставник → стажеры.
+    Имена берутся из актуальных профилей стажеров; карта "Trainee" из
+    профиля наставника используется только если профиля стажера нет.
+    """
+    legacy = mentor_data.get("Trainee") or {}
+    trainees = {}
+    for trainee_id in await get_trainee_ids_async(mentor_id):
+        trainees[trainee_id] = await load_from_json_async(trainee_id) or legacy.get(trainee_id, {})
+    return trainees
+
 # Отображение списка стажеров
 @router.message(lambda message: message.text == "/trainee")
-async def show_trainees(message: Message):
+async def show_trainees(message: Message, user_profile):
     """
     Команда /trainee для отображения списка стажеров наставника.
     """
     user_id = message.from_user.id
 
-    # Загружаем данные наставника
-    mentor_data = load_from_json(user_id)
+    # Профиль наставника загружен UserProfileMiddleware
+    mentor_data = user_profile
     if not mentor_data or mentor_data.get("role") != "mentor":
         await message.answer("Вы не являетесь наставником. У вас нет доступа к этой команде.")
         logger.warning(f"Пользователь {user_id} пытался открыть список стажеров, не являясь наставником.")
         return
 
     # Получаем список стажеров
-    trainees = mentor_data.get("Trainee", {})
+    trainees = await load_trainees(user_id, mentor_data)
     if not trainees:
         await message.answer("У вас пока нет стажеров.")
         logger.info(f"У наставника {user_id} нет стажеров.")
@@ -40,7 +58,7 @@ async def show_trainees(message: Message):
         inline_keyboard=[
             [InlineKeyboardButton(
                 text=f"{data.get('first_name', 'Неизвестно')} {data.get('last_name', 'Неизвестно')}",
-                callback_data=f"trainee_details:{trainee_id}"
+                callback_data=TraineeDetailsCallbackData(trainee_id=str(trainee_id)).pack()
             )]
             for trainee_id, data in trainees.items()
         ]
@@ -50,26 +68,26 @@ async def show_trainees(message: Message):
 
 
 # Отображение профиля стажера
-@router.callback_query(lambda c: c.data.startswith("trainee_details:"))
-async def show_trainee_details(callback: CallbackQuery):
+@callbacks.handler(TraineeDetailsCallbackData)
+async def show_trainee_details(callback: CallbackQuery, callback_data: TraineeDetailsCallbackData, user_profile):
     """
     Обработчик для кнопок стажеров. Показывает профиль стажера.
     """
     user_id = callback.from_user.id
-    trainee_id = callback.data.split(":")[1]
+    trainee_id = callback_data.trainee_id
 
     # Удаляем старое сообщение
     await callback.message.delete()
 
-    # Загружаем данные наставника
-    mentor_data = load_from_json(user_id)
+    # Профиль наставника загружен UserProfileMiddleware
+    mentor_data = user_profile
     if not mentor_data or mentor_data.get("role") != "mentor":
         await callback.answer("Ошибка: у вас нет доступа к этой информации.", show_alert=True)
         logger.warning(f"Пользователь {user_id} пытался получить данные стажера, не являясь наставником.")
         return
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -101,19 +119,19 @@ async def show_trainee_details(callback: CallbackQuery):
         )],
         [InlineKeyboardButton(
             text="Задания",
-            callback_data=f"trainee_tasks:0:{trainee_id}"  # Добавляем номер страницы
+            callback_data=TraineeTasksCallbackData(page=0, trainee_id=trainee_id).pack()  # Добавляем номер страницы
         )],
         [InlineKeyboardButton(
             text="Прогресс",
-            callback_data=f"trainee_progress:{trainee_id}"
+            callback_data=TraineeProgressCallbackData(trainee_id=trainee_id).pack()
         )],
         [InlineKeyboardButton(
             text="Итоговый тест аттестация",
-            callback_data=f"final_test:{trainee_id}"
+            callback_data=FinalTestCallbackData(trainee_id=trainee_id).pack()
         )],
         [InlineKeyboardButton(
             text="Повысить до оператора",
-            callback_data=f"promote_to_operator:{trainee_id}"
+            callback_data=PromoteCallbackData(trainee_id=trainee_id).pack()
         )],
     ]
 
@@ -123,15 +141,15 @@ async def show_trainee_details(callback: CallbackQuery):
     await callback.message.answer(trainee_details, reply_markup=keyboard)
 
 # Кнопка "Открыть тестирование"
-@router.callback_query(lambda c: c.data.startswith("start_final_test:"))
-async def start_final_test(callback: CallbackQuery):
+@callbacks.handler(StartFinalTestCallbackData)
+async def start_final_test(callback: CallbackQuery, callback_data: StartFinalTestCallbackData):
     """
     Обработчик для кнопки "Открыть тестирование".
     """
-    _, trainee_id = callback.data.split(":")
+    trainee_id = callback_data.trainee_id
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -171,22 +189,22 @@ async def start_final_test(callback: CallbackQuery):
             f"Тест не может быть открыт по следующим причинам:\n{unmet_conditions_text}",
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
-                    [InlineKeyboardButton(text="Назад в меню стажера", callback_data=f"trainee_details:{trainee_id}")]
+                    [InlineKeyboardButton(text="Назад в меню стажера", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())]
                 ]
             )
         )
         return
 
     # Все условия выполнены — обновляем данные стажера
-    trainee_data["final_test_ready"] = True
-    save_user_data(trainee_id, trainee_data)
+    async with user_lock(trainee_id):
+        await update_user_data_async(trainee_id, fields={"final_test_ready": True})
 
     # Уведомление наставнику
     await callback.message.edit_text(
         "✅ Итоговое тестирование открыто для стажера.",
         reply_markup=InlineKeyboardMarkup(
             inline_keyboard=[
-                [InlineKeyboardButton(text="Назад в меню стажера", callback_data=f"trainee_details:{trainee_id}")]
+                [InlineKeyboardButton(text="Назад в меню стажера", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())]
             ]
         )
     )
@@ -195,26 +213,27 @@ async def start_final_test(callback: CallbackQuery):
     trainee_chat_id = trainee_data.get("user_id")  
     if trainee_chat_id:
         try:
-            await bot.send_message(
-                trainee_chat_id,
-                "✅ Для вас открыто итоговое тестирование!\n"
-                "Чтобы пройти тестирование, введите команду: /attestatsiya"
-            )
+            with outbound_priority(NOTIFICATION):
+                await bot.send_message(
+                    trainee_chat_id,
+                    "✅ Для вас открыто итоговое тестирование!\n"
+                    "Чтобы пройти тестирование, введите команду: /attestatsiya"
+                )
             logger.info(f"Стажеру с ID {trainee_chat_id} отправлено уведомление об открытии теста.")
         except Exception as e:
             logger.error(f"Не удалось отправить сообщение стажеру с ID {trainee_chat_id}: {e}")
     else:
         logger.warning(f"Не удалось отправить сообщение: у стажера отсутствует user_id.")
 # Кнопка "Итоговое тестирование"
-@router.callback_query(lambda c: c.data.startswith("final_test:"))
-async def show_final_test(callback: CallbackQuery):
+@callbacks.handler(FinalTestCallbackData)
+async def show_final_test(callback: CallbackQuery, callback_data: FinalTestCallbackData):
     """
     Обработчик для кнопки "Итоговое тестирование".
     """
-    _, trainee_id = callback.data.split(":")
+    trainee_id = callback_data.trainee_id
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -259,190 +278,29 @@ async def show_final_test(callback: CallbackQuery):
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="Открыть тестирование", callback_data=f"start_final_test:{trainee_id}")
+                InlineKeyboardButton(text="Открыть тестирование", callback_data=StartFinalTestCallbackData(trainee_id=trainee_id).pack())
             ],
             [
-                InlineKeyboardButton(text="Назад в меню стажера", callback_data=f"trainee_details:{trainee_id}")
+                InlineKeyboardButton(text="Назад в меню стажера", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())
             ]
         ]
     )
 
     await callback.message.edit_text(message_text, reply_markup=keyboard)
 
-# Отображение профиля стажера
-@router.callback_query(lambda c: c.data.startswith("trainee_details:"))
-async def show_trainee_details(callback: CallbackQuery):
-    """
-    Обработчик для кнопок стажеров. Показывает профиль стажера.
-    """
-    user_id = callback.from_user.id
-    trainee_id = callback.data.split(":")[1]
-
-    # Удаляем старое сообщение
-    await callback.message.delete()
-
-    # Загружаем данные наставника
-    mentor_data = load_from_json(user_id)
-    if not mentor_data or mentor_data.get("role") != "mentor":
-        await callback.answer("Ошибка: у вас нет доступа к этой информации.", show_alert=True)
-        logger.warning(f"Пользователь {user_id} пытался получить данные стажера, не являясь наставником.")
-        return
-
-    # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
-    if not trainee_data:
-        await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
-        logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
-        return
-
-    # Формируем информацию о стажере
-    trainee_name = f"{trainee_data.get('first_name', 'Неизвестно')} {trainee_data.get('last_name', 'Неизвестно')}"
-    trainee_phone = trainee_data.get("phone_number", "Не указан")
-    registration_date = trainee_data.get("registration_date", "Дата регистрации отсутствует")
-
-    # Вычисляем количество заданий
-    mistakes = trainee_data.get("mistakes", [])
-    num_tasks = len(mistakes) if isinstance(mistakes, list) else 0
-
-    # Формируем сообщение для наставника
-    trainee_details = (
-        f"Профиль стажера:\n\n"
-        f"Имя: {trainee_name}\n"
-        f"Номер телефона: {trainee_phone}\n"
-        f"Дата регистрации: {registration_date}\n"
-        f"Количество заданий: {num_tasks}\n"
-    )
-
-    # Формируем кнопки
-    keyboard_buttons = [
-        [InlineKeyboardButton(
-            text="Связаться со стажером",
-            url=f"tg://user?id={trainee_id}"
-        )],
-        [InlineKeyboardButton(
-            text="Задания",
-            callback_data=f"trainee_tasks:0:{trainee_id}"  # Добавляем номер страницы
-        )],
-        [InlineKeyboardButton(
-            text="Прогресс",
-            callback_data=f"trainee_progress:{trainee_id}"
-        )]
-    ]
-
-    # Проверяем наличие "final_test_ready" у стажера
-    if not trainee_data.get("final_test_ready", False):
-        # Если аттестация не открыта, добавляем кнопку
-        keyboard_buttons.append([
-            InlineKeyboardButton(
-                text="Итоговый тест аттестация",
-                callback_data=f"final_test:{trainee_id}"
-            )
-        ])
-
-    # Создаем клавиатуру
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-
-    await callback.message.answer(trainee_details, reply_markup=keyboard)
-
-
-# Кнопка "Открыть тестирование"
-@router.callback_query(lambda c: c.data.startswith("start_final_test:"))
-async def start_final_test(callback: CallbackQuery):
-    """
-    Обработчик для кнопки "Открыть тестирование".
-    """
-    _, trainee_id = callback.data.split(":")
-
-    # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
-    if not trainee_data:
-        await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
-        logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
-        return
-
-    # Проверяем условия для открытия теста
-    conditions = []
-
-    # Условие 1: Пройти основной курс обучения
-    course_plan = trainee_data.get("course_plan", {})
-    all_courses_completed = all(
-        lesson.get("status") == "completed" 
-        for lessons in course_plan.values() 
-        for lesson in lessons
-    )
-    conditions.append(("Пройти основной курс обучения", all_courses_completed))
-
-    # Условие 2: Выполнить все задания
-    mistakes = trainee_data.get("mistakes", [])
-    all_tasks_completed = all(task.get("quest_status") == "completed" for task in mistakes)
-    conditions.append(("Выполнить все задания", all_tasks_completed))
-
-    # Условие 3: Отработать 1 месяц
-    registration_date = trainee_data.get("registration_date")
-    if registration_date:
-        registration_date = datetime.strptime(registration_date, "%Y-%m-%d")
-        one_month_passed = (datetime.now() - registration_date) >= timedelta(days=30)
-    else:
-        one_month_passed = False
-    conditions.append(("Отработать 1 месяц", one_month_passed))
-
-    # Проверяем, выполнены ли все условия
-    unmet_conditions = [condition for condition, status in conditions if not status]
-    if unmet_conditions:
-        unmet_conditions_text = "\n".join(f"❌ {condition}" for condition in unmet_conditions)
-        await callback.message.edit_text(
-            f"Тест не может быть открыт по следующим причинам:\n{unmet_conditions_text}",
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="Назад в меню стажера", callback_data=f"trainee_details:{trainee_id}")]
-                ]
-            )
-        )
-        return
-
-    # Все условия выполнены — обновляем данные стажера
-    trainee_data["final_test_ready"] = True
-    save_user_data(trainee_id, trainee_data)
-
-    # Уведомление наставнику
-    await callback.message.edit_text(
-        "✅ Итоговое тестирование открыто для стажера.",
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="Назад в меню стажера", callback_data=f"trainee_details:{trainee_id}")]
-            ]
-        )
-    )
-
-    # Уведомление стажеру
-    trainee_chat_id = trainee_data.get("user_id")  
-    if trainee_chat_id:
-        try:
-            await bot.send_message(
-                trainee_chat_id,
-                "✅ Для вас открыто итоговое тестирование!\n"
-                "Чтобы пройти тестирование, введите команду: /attestatsiya"
-            )
-            logger.info(f"Стажеру с ID {trainee_chat_id} отправлено уведомление об открытии теста.")
-        except Exception as e:
-            logger.error(f"Не удалось отправить сообщение стажеру с ID {trainee_chat_id}: {e}")
-    else:
-        logger.warning(f"Не удалось отправить сообщение: у стажера отсутствует user_id.")
-
 # Отображение заданий стажера
-@router.callback_query(lambda c: c.data.startswith("trainee_tasks:"))
-async def show_trainee_tasks(callback: CallbackQuery):
+@callbacks.handler(TraineeTasksCallbackData)
+async def show_trainee_tasks(callback: CallbackQuery, callback_data: TraineeTasksCallbackData):
     """
     Обработчик для кнопки "Задания". Показывает задания стажера.
     """
-    _, page_number, trainee_id = callback.data.split(":")
-    page_number = int(page_number)
+    page_number, trainee_id = callback_data.page, callback_data.trainee_id
 
     # Удаляем старое сообщение
     await callback.message.delete()
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -472,7 +330,7 @@ async def show_trainee_tasks(callback: CallbackQuery):
     keyboard_buttons = [
         [InlineKeyboardButton(
             text=f"{idx + 1} {task['quest'].split()[0]} {'✅' if task.get('quest_status') == 'completed' else '❌'}",
-            callback_data=f"task_details:{idx}:{trainee_id}"
+            callback_data=TaskDetailsCallbackData(index=idx, trainee_id=trainee_id).pack()
         )]
         for idx, task in enumerate(tasks_for_page, start=start_index)
     ]
@@ -482,12 +340,12 @@ async def show_trainee_tasks(callback: CallbackQuery):
     if start_index > 0:
         navigation_buttons.append(InlineKeyboardButton(
             text="⬅️ Назад", 
-            callback_data=f"trainee_tasks:{page_number - 1}:{trainee_id}"
+            callback_data=TraineeTasksCallbackData(page=page_number - 1, trainee_id=trainee_id).pack()
         ))
     if end_index < total_tasks:
         navigation_buttons.append(InlineKeyboardButton(
             text="Вперед ➡️", 
-            callback_data=f"trainee_tasks:{page_number + 1}:{trainee_id}"
+            callback_data=TraineeTasksCallbackData(page=page_number + 1, trainee_id=trainee_id).pack()
         ))
 
     if navigation_buttons:
@@ -498,30 +356,30 @@ async def show_trainee_tasks(callback: CallbackQuery):
     await callback.message.answer(message_text, reply_markup=keyboard)
 
 # Обработчик для изменения статуса задания
-@router.callback_query(lambda c: c.data.startswith("task_details:"))
-async def update_task_status(callback: CallbackQuery):
+@callbacks.handler(TaskDetailsCallbackData)
+async def update_task_status(callback: CallbackQuery, callback_data: TaskDetailsCallbackData):
     """
     Обработчик для изменения статуса задания на "выполнено".
     """
-    _, task_index, trainee_id = callback.data.split(":")
-    task_index = int(task_index)
+    task_index, trainee_id = callback_data.index, callback_data.trainee_id
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
-    if not trainee_data:
-        await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
-        logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
-        return
-
-    tasks = trainee_data.get("mistakes", [])
-    if task_index >= len(tasks):
-        await callback.answer("Ошибка: задание не найдено.", show_alert=True)
-        logger.error(f"Задание с индексом {task_index} не найдено для стажера {trainee_id}.")
-        return
-
-    # Обновляем статус задания
-    tasks[task_index]["quest_status"] = "completed"
-    save_user_data(trainee_id, trainee_data)
+    async with user_lock(trainee_id):
+        trainee_data = await load_from_json_async(trainee_id)
+        if not trainee_data:
+            await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
+            logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
+            return
+
+        tasks = trainee_data.get("mistakes", [])
+        if task_index >= len(tasks):
+            await callback.answer("Ошибка: задание не найдено.", show_alert=True)
+            logger.error(f"Задание с индексом {task_index} не найдено для стажера {trainee_id}.")
+            return
+
+        # Обновляем статус задания
+        tasks[task_index]["quest_status"] = "completed"
+        await update_user_data_async(trainee_id, mistake_updates={task_index: {"quest_status": "completed"}})
 
     # Формируем обновленный список кнопок
     page_number = task_index // TASKS_PER_PAGE  # Рассчитываем текущую страницу
@@ -532,7 +390,7 @@ async def update_task_status(callback: CallbackQuery):
     keyboard_buttons = [
         [InlineKeyboardButton(
             text=f"{idx + 1} {task['quest'].split()[0]} {'✅' if task.get('quest_status') == 'completed' else '❌'}",
-            callback_data=f"task_details:{idx}:{trainee_id}"
+            callback_data=TaskDetailsCallbackData(index=idx, trainee_id=trainee_id).pack()
         )]
         for idx, task in enumerate(tasks_for_page, start=start_index)
     ]
@@ -542,12 +400,12 @@ async def update_task_status(callback: CallbackQuery):
     if start_index > 0:
         navigation_buttons.append(InlineKeyboardButton(
             text="⬅️ Назад",
-            callback_data=f"trainee_tasks:{page_number - 1}:{trainee_id}"
+            callback_data=TraineeTasksCallbackData(page=page_number - 1, trainee_id=trainee_id).pack()
         ))
     if end_index < len(tasks):
         navigation_buttons.append(InlineKeyboardButton(
             text="Вперед ➡️",
-            callback_data=f"trainee_tasks:{page_number + 1}:{trainee_id}"
+            callback_data=TraineeTasksCallbackData(page=page_number + 1, trainee_id=trainee_id).pack()
         ))
 
     if navigation_buttons:
@@ -560,19 +418,19 @@ async def update_task_status(callback: CallbackQuery):
     await callback.answer("Задание отмечено как выполненное!")
 
 # Отображение прогресса стажера
-@router.callback_query(lambda c: c.data.startswith("trainee_progress:"))
-async def show_trainee_progress(callback: CallbackQuery):
+@callbacks.handler(TraineeProgressCallbackData)
+async def show_trainee_progress(callback: CallbackQuery, callback_data: TraineeProgressCallbackData):
     """
     Обработчик для кнопки "Прогресс". Показывает прогресс обучения стажера.
     """
     user_id = callback.from_user.id
-    trainee_id = callback.data.split(":")[1]
+    trainee_id = callback_data.trainee_id
 
     # Удаляем старое сообщение
     await callback.message.delete()
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -605,89 +463,21 @@ async def show_trainee_progress(callback: CallbackQuery):
     # Кнопка "Назад"
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Назад", callback_data=f"trainee_details:{trainee_id}")]
+            [InlineKeyboardButton(text="Назад", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())]
         ]
     )
 
     await callback.message.answer(progress_message, reply_markup=keyboard)
-# Отображение профиля стажера
-@router.callback_query(lambda c: c.data.startswith("trainee_details:"))
-async def show_trainee_details(callback: CallbackQuery):
-    """
-    Обработчик для кнопок стажеров. Показывает профиль стажера.
-    """
-    user_id = callback.from_user.id
-    trainee_id = callback.data.split(":")[1]
-
-    # Удаляем старое сообщение
-    await callback.message.delete()
-
-    # Загружаем данные наставника
-    mentor_data = load_from_json(user_id)
-    if not mentor_data or mentor_data.get("role") != "mentor":
-        await callback.answer("Ошибка: у вас нет доступа к этой информации.", show_alert=True)
-        logger.warning(f"Пользователь {user_id} пытался получить данные стажера, не являясь наставником.")
-        return
-
-    # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
-    if not trainee_data:
-        await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
-        logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
-        return
-
-    # Формируем информацию о стажере
-    trainee_name = f"{trainee_data.get('first_name', 'Неизвестно')} {trainee_data.get('last_name', 'Неизвестно')}"
-    trainee_phone = trainee_data.get("phone_number", "Не указан")
-    registration_date = trainee_data.get("registration_date", "Дата регистрации отсутствует")
-
-    # Вычисляем количество заданий
-    mistakes = trainee_data.get("mistakes", [])
-    num_tasks = len(mistakes) if isinstance(mistakes, list) else 0
-
-    # Формируем сообщение для наставника
-    trainee_details = (
-        f"Профиль стажера:\n\n"
-        f"Имя: {trainee_name}\n"
-        f"Номер телефона: {trainee_phone}\n"
-        f"Дата регистрации: {registration_date}\n"
-        f"Количество заданий: {num_tasks}\n"
-    )
-
-    # Формируем кнопки
-    keyboard_buttons = [
-        [InlineKeyboardButton(
-            text="Связаться со стажером",
-            url=f"tg://user?id={trainee_id}"
-        )],
-        [InlineKeyboardButton(
-            text="Задания",
-            callback_data=f"trainee_tasks:0:{trainee_id}"  # Добавляем номер страницы
-        )],
-        [InlineKeyboardButton(
-            text="Прогресс",
-            callback_data=f"trainee_progress:{trainee_id}"
-        )],
-        [InlineKeyboardButton(
-            text="Повысить до оператора",
-            callback_data=f"promote_to_operator:{trainee_id}"
-        )]
-    ]
-
-    # Создаем клавиатуру
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-
-    await callback.message.answer(trainee_details, reply_markup=keyboard)
 
 
 # Кнопка "Повысить до оператора"
-@router.callback_query(lambda c: c.data.startswith("promote_to_operator:"))
-async def promote_to_operator(callback: CallbackQuery):
+@callbacks.handler(PromoteCallbackData)
+async def promote_to_operator(callback: CallbackQuery, callback_data: PromoteCallbackData):
     """
     Обработчик кнопки "Повысить до оператора".
     Показывает текст с требованиями для перевода и предоставляет кнопки для подтверждения или возврата.
     """
-    trainee_id = callback.data.split(":")[1]
+    trainee_id = callback_data.trainee_id
 
     # Удаляем старое сообщение
     await callback.message.delete()
@@ -705,11 +495,11 @@ async def promote_to_operator(callback: CallbackQuery):
         inline_keyboard=[
             [InlineKeyboardButton(
                 text="Повысить",
-                callback_data=f"confirm_promotion:{trainee_id}"
+                callback_data=ConfirmPromotionCallbackData(trainee_id=trainee_id).pack()
             )],
             [InlineKeyboardButton(
                 text="Назад",
-                callback_data=f"trainee_details:{trainee_id}"
+                callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack()
             )]
         ]
     )
@@ -718,19 +508,19 @@ async def promote_to_operator(callback: CallbackQuery):
 
 
 # Кнопка "Повысить" (подтверждение перевода)
-@router.callback_query(lambda c: c.data.startswith("confirm_promotion:"))
-async def confirm_promotion(callback: CallbackQuery):
+@callbacks.handler(ConfirmPromotionCallbackData)
+async def confirm_promotion(callback: CallbackQuery, callback_data: ConfirmPromotionCallbackData):
     """
     Обработчик для кнопки "Повысить".
     Проверяет выполнение условий и выполняет перевод стажера в операторы.
     """
-    trainee_id = callback.data.split(":")[1]
+    trainee_id = callback_data.trainee_id
 
     # Удаляем старое сообщение
     await callback.message.delete()
 
     # Загружаем данные стажера
-    trainee_data = load_from_json(trainee_id)
+    trainee_data = await load_from_json_async(trainee_id)
     if not trainee_data:
         await callback.answer("Ошибка: данные стажера не найдены.", show_alert=True)
         logger.error(f"Данные стажера с ID {trainee_id} не найдены.")
@@ -773,35 +563,29 @@ async def confirm_promotion(callback: CallbackQuery):
             f"Сотрудник не может быть повышен до оператора по следующим причинам:\n{unmet_conditions_text}",
             reply_markup=InlineKeyboardMarkup(
                 inline_keyboard=[
-                    [InlineKeyboardButton(text="Назад", callback_data=f"trainee_details:{trainee_id}")]
+                    [InlineKeyboardButton(text="Назад", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())]
                 ]
             )
         )
         return
 
     # Все условия выполнены — обновляем данные стажера
-    trainee_data["role"] = "Employee"
-    for key in ["course", "course_plan", "mistakes", "final_test_ready", "mentor"]:
-        trainee_data.pop(key, None)
-    save_user_data(trainee_id, trainee_data)
-
-    # Удаляем информацию о стажере у наставника
-    mentor_id = callback.from_user.id
-    mentor_data = load_from_json(mentor_id)
-    if mentor_data and "Trainee" in mentor_data:
-        if trainee_id in mentor_data["Trainee"]:
-            del mentor_data["Trainee"][trainee_id]
-            save_user_data(mentor_id, mentor_data)
-            logger.info(f"Стажер с ID {trainee_id} удалён из списка наставника {mentor_id}.")
-        else:
-            logger.warning(f"Стажер с ID {trainee_id} отсутствует в данных наставника {mentor_id}.")
+    async with user_lock(trainee_id):
+        await update_user_data_async(trainee_id, fields={
+            "role": "Employee",
+            **{key: None for key in ["course", "course_plan", "mistakes", "final_test_ready", "mentor"]}
+        })
+
+    # Профиль наставника не меняется: стажер выпадает из индекса
+    # наставник → стажеры, как только у него сброшено поле mentor и роль стала Employee
+    logger.info(f"Стажер с ID {trainee_id} переведён в операторы и снят с наставника {callback.from_user.id}.")
 
     # Уведомление наставнику
     await callback.message.answer(
         "✅ Сотрудник успешно повышен до оператора.",
         reply_markup=InlineKeyboardMarkup(
             inline_keyboard=[
-                [InlineKeyboardButton(text="Назад", callback_data=f"trainee_details:{trainee_id}")]
+                [InlineKeyboardButton(text="Назад", callback_data=TraineeDetailsCallbackData(trainee_id=trainee_id).pack())]
             ]
         )
     )
\ No newline at end of file
@@ -2,9 +2,13 @@ import logging
 from aiogram import Router, types, Bot
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
-from aiogram.filters.callback_data import CallbackData
 from text import MENU_TEXT
-from utils.json_utils import load_user_data, save_user_data  # Импортируем функции работы с JSON
+from handlers.mentor import load_trainees
+from utils.callback_router import callbacks
+from handlers.callback_data import (
+    ProfileCallbackData, AssignmentsCallbackData, TrainingCallbackData, FeedbackCallbackData,
+    CoursesCallbackData, MentorMenuCallbackData, TraineeDetailsCallbackData
+)
 
 # Настройка логирования: вывод логов только в консоль
 logging.basicConfig(
@@ -16,63 +20,51 @@ logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Определяем callback_data для профиля
-class ProfileCallbackData(CallbackData, prefix="profile"):
-    action: str
-
-# Определяем callback_data для заданий
-class AssignmentsCallbackData(CallbackData, prefix="assignments"):
-    action: str
-
-async def show_menu(message: types.Message):
-    """Показывает главное меню."""
-    logger.info(f"Отправка главного меню пользователю {message.from_user.id}")
-
-    # Загружаем данные пользователя
-    user_id = message.from_user.id
-    user_data = load_user_data(user_id)
+async def show_menu(message: types.Message, user_role):
+    """Показывает главное меню; user_role — роль из профиля (UserProfileMiddleware)."""
+    logger.info(f"Отправка главного меню в чат {message.chat.id}")
 
     # Проверяем, является ли пользователь наставником
-    is_mentor = user_data.get("role") == "mentor" if user_data else False
+    is_mentor = user_role == "mentor"
 
     # Формируем клавиатуру
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Профиль", callback_data=ProfileCallbackData(action="show_profile").pack())],
         [InlineKeyboardButton(text="Мои задания", callback_data=AssignmentsCallbackData(action="show_assignments").pack())],
-        [InlineKeyboardButton(text="Обучение", callback_data="training")],
-        [InlineKeyboardButton(text="Обратная связь", callback_data="feedback")],
-        [InlineKeyboardButton(text="Курсы", callback_data="courses")],
+        [InlineKeyboardButton(text="Обучение", callback_data=TrainingCallbackData().pack())],
+        [InlineKeyboardButton(text="Обратная связь", callback_data=FeedbackCallbackData().pack())],
+        [InlineKeyboardButton(text="Курсы", callback_data=CoursesCallbackData().pack())],
     ])
 
     # Если пользователь наставник, добавляем кнопку "Меню наставника"
     if is_mentor:
         keyboard.inline_keyboard.append(
-            [InlineKeyboardButton(text="Меню наставника", callback_data="mentor_menu")]
+            [InlineKeyboardButton(text="Меню наставника", callback_data=MentorMenuCallbackData().pack())]
         )
 
     await message.answer(MENU_TEXT, reply_markup=keyboard)
 
 @router.message(Command("menu"))
-async def menu_command(message: types.Message):
+async def menu_command(message: types.Message, user_role):
     logger.info(f"Команда /menu от пользователя {message.from_user.id}")
-    await show_menu(message)
+    await show_menu(message, user_role)
 
 @router.message(lambda message: message.text == "/trainee")
-async def show_trainees(message: Message):
+async def show_trainees(message: Message, user_profile):
     """
     Команда /trainee для отображения списка стажеров наставника.
     """
     user_id = message.from_user.id
 
-    # Загружаем данные наставника
-    mentor_data = load_user_data(user_id)
+    # Профиль наставника загружен UserProfileMiddleware
+    mentor_data = user_profile
     if not mentor_data or mentor_data.get("role") != "mentor":
         await message.answer("Вы не являетесь наставником. У вас нет доступа к этой команде.")
         logger.warning(f"Пользователь {user_id} пытался открыть список стажеров, не являясь наставником.")
         return
 
     # Получаем список стажеров
-    trainees = mentor_data.get("Trainee", {})
+    trainees = await load_trainees(user_id, mentor_data)
     if not trainees:
         await message.answer("У вас пока нет стажеров.")
         logger.info(f"У наставника {user_id} нет стажеров.")
@@ -86,7 +78,7 @@ async def show_trainees(message: Message):
         inline_keyboard=[
             [InlineKeyboardButton(
                 text=f"{data.get('first_name', 'Неизвестно')} {data.get('last_name', 'Неизвестно')}",
-                callback_data=f"trainee_details:{trainee_id}"
+                callback_data=TraineeDetailsCallbackData(trainee_id=str(trainee_id)).pack()
             )]
             for trainee_id, data in trainees.items()
         ]
@@ -94,8 +86,8 @@ async def show_trainees(message: Message):
 
     await message.answer(message_text, reply_markup=keyboard)
 
-@router.callback_query(lambda c: c.data == "mentor_menu")
-async def mentor_menu_command(callback_query: types.CallbackQuery, bot: Bot):
+@callbacks.handler(MentorMenuCallbackData)
+async def mentor_menu_command(callback_query: types.CallbackQuery, bot: Bot, user_profile):
     """
     Обработчик кнопки 'Меню наставника'.
     Открывает меню для наставника, аналогичное команде /trainee.
@@ -112,9 +104,9 @@ async def mentor_menu_command(callback_query: types.CallbackQuery, bot: Bot):
     except Exception as e:
         logger.warning(f"Ошибка удаления сообщения: {e}")
     
-    # Загружаем данные наставника
+    # Данные наставника уже загружены middleware
     user_id = callback_query.from_user.id
-    mentor_data = load_user_data(user_id)
+    mentor_data = user_profile
     if not mentor_data or mentor_data.get("role") != "mentor":
         await callback_query.message.answer("Вы не являетесь наставником. У вас нет доступа к этому меню.")
         logger.warning(f"Пользователь {user_id} пытался открыть меню наставника, не являясь наставником.")
@@ -122,7 +114,7 @@ async def mentor_menu_command(callback_query: types.CallbackQuery, bot: Bot):
         return
 
     # Получаем список стажеров
-    trainees = mentor_data.get("Trainee", {})
+    trainees = await load_trainees(user_id, mentor_data)
     if not trainees:
         await callback_query.message.answer("У вас пока нет стажеров.")
         logger.info(f"У наставника {user_id} нет стажеров.")
@@ -137,7 +129,7 @@ async def mentor_menu_command(callback_query: types.CallbackQuery, bot: Bot):
         inline_keyboard=[
             [InlineKeyboardButton(
                 text=f"{data.get('first_name', 'Неизвестно')} {data.get('last_name', 'Неизвестно')}",
-                callback_data=f"trainee_details:{trainee_id}"
+                callback_data=TraineeDetailsCallbackData(trainee_id=str(trainee_id)).pack()
             )]
             for trainee_id, data in trainees.items()
         ]
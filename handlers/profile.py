@@ -1,11 +1,16 @@
 import os
-import json
 import logging
 from aiogram import Router, F, Bot, types
-from aiogram.types import Message, FSInputFile, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
+from utils.media_cache import send_cached_media
+from utils.callback_router import callbacks
+from handlers.callback_data import (
+    MenuCallbackData, EditProfileCallbackData, MyAssignmentsCallbackData, BackToProfileCallbackData,
+    ProfileCallbackData, AssignmentsCallbackData
+)
 
 # Настройка логирования: вывод логов только в консоль
 logging.basicConfig(
@@ -26,32 +31,21 @@ class EditProfile(StatesGroup):
     waiting_for_mentor = State()
     waiting_for_email = State()
 
-class MenuCallbackData:
-    action = "back_to_menu"
-
-class EditCallbackData:
-    action = "edit_profile"
-
-class AssignmentsCallbackData:
-    action = "my_assignments"
-
-async def profile_command(event: Message | CallbackQuery):
+async def profile_command(event: Message | CallbackQuery, user_profile):
     """Выводит профиль пользователя с кнопками 'Меню', 'Редактировать' и 'Мои задания'."""
     user_id = event.from_user.id
-    filename = f"data/users/user_{user_id}.json"
     image_path = "images/profile.jpg"
 
-    if not os.path.exists(filename):
+    data = user_profile
+    if not data:
         text = "❌ *Профиль не найден.*\nЗаполните анкету командой /start."
-        logger.warning(f"Профиль не найден для пользователя {user_id} (файл {filename} отсутствует)")
+        logger.warning(f"Профиль не найден для пользователя {user_id}")
         if isinstance(event, Message):
             await event.answer(text, parse_mode="Markdown")
         elif isinstance(event, CallbackQuery):
             await event.message.answer(text, parse_mode="Markdown")
         return
 
-    with open(filename, "r", encoding="utf-8") as file:
-        data = json.load(file)
     logger.info(f"Загружен профиль пользователя {user_id}")
 
     profile_text = (
@@ -71,18 +65,18 @@ async def profile_command(event: Message | CallbackQuery):
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Меню", callback_data=MenuCallbackData.action)],
-            [InlineKeyboardButton(text="✏️ Редактировать", callback_data=EditCallbackData.action)],
-            [InlineKeyboardButton(text="📋 Мои задания", callback_data=AssignmentsCallbackData.action)]
+            [InlineKeyboardButton(text="🔙 Меню", callback_data=MenuCallbackData().pack())],
+            [InlineKeyboardButton(text="✏️ Редактировать", callback_data=EditProfileCallbackData().pack())],
+            [InlineKeyboardButton(text="📋 Мои задания", callback_data=MyAssignmentsCallbackData().pack())]
         ]
     )
 
     if os.path.exists(image_path):
         logger.info(f"Отправка профиля с изображением для пользователя {user_id}")
         if isinstance(event, Message):
-            await event.answer_photo(photo=FSInputFile(image_path), caption=profile_text, parse_mode="Markdown", reply_markup=keyboard)
+            await send_cached_media(event.answer_photo, "photo", image_path, caption=profile_text, parse_mode="Markdown", reply_markup=keyboard)
         elif isinstance(event, CallbackQuery):
-            await event.message.answer_photo(photo=FSInputFile(image_path), caption=profile_text, parse_mode="Markdown", reply_markup=keyboard)
+            await send_cached_media(event.message.answer_photo, "photo", image_path, caption=profile_text, parse_mode="Markdown", reply_markup=keyboard)
     else:
         logger.info(f"Изображение профиля не найдено. Отправка только текста для пользователя {user_id}")
         if isinstance(event, Message):
@@ -90,20 +84,24 @@ async def profile_command(event: Message | CallbackQuery):
         elif isinstance(event, CallbackQuery):
             await event.message.answer(profile_text, parse_mode="Markdown", reply_markup=keyboard)
 
-@router.callback_query(lambda c: c.data == AssignmentsCallbackData.action)
-async def show_assignments(callback_query: CallbackQuery, bot: Bot):
+@callbacks.handler(ProfileCallbackData)
+async def show_profile(callback_query: CallbackQuery, user_profile):
+    """Кнопка 'Профиль' главного меню."""
+    await profile_command(callback_query, user_profile)
+    await callback_query.answer()
+
+@callbacks.handler(AssignmentsCallbackData)
+@callbacks.handler(MyAssignmentsCallbackData)
+async def show_assignments(callback_query: CallbackQuery, bot: Bot, user_profile):
     """Показывает задания пользователя из раздела 'mistakes'."""
     user_id = callback_query.from_user.id
-    filename = f"data/users/user_{user_id}.json"
 
-    if not os.path.exists(filename):
-        logger.warning(f"Профиль не найден для пользователя {user_id} (файл {filename} отсутствует)")
+    data = user_profile
+    if not data:
+        logger.warning(f"Профиль не найден для пользователя {user_id}")
         await callback_query.answer("Профиль не найден.", show_alert=True)
         return
 
-    with open(filename, "r", encoding="utf-8") as file:
-        data = json.load(file)
-
     mistakes = data.get("mistakes", [])
     if not mistakes:
         assignments_text = "✅ У вас нет заданий для выполнения. Все ошибки пройдены!"
@@ -114,8 +112,8 @@ async def show_assignments(callback_query: CallbackQuery, bot: Bot):
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="📌 Профиль", callback_data="back_to_profile")],
-            [InlineKeyboardButton(text="🔙 Меню", callback_data=MenuCallbackData.action)],
+            [InlineKeyboardButton(text="📌 Профиль", callback_data=BackToProfileCallbackData().pack())],
+            [InlineKeyboardButton(text="🔙 Меню", callback_data=MenuCallbackData().pack())],
         ]
     )
 
@@ -128,8 +126,8 @@ async def show_assignments(callback_query: CallbackQuery, bot: Bot):
     await callback_query.message.answer(assignments_text, parse_mode="Markdown", reply_markup=keyboard)
     await callback_query.answer()
 
-@router.callback_query(lambda c: c.data == "back_to_profile")
-async def back_to_profile(callback_query: CallbackQuery, bot: Bot):
+@callbacks.handler(BackToProfileCallbackData)
+async def back_to_profile(callback_query: CallbackQuery, bot: Bot, user_profile):
     """Возвращает пользователя к просмотру профиля."""
     logger.info(f"Callback 'back_to_profile' от пользователя {callback_query.from_user.id}")
     try:
@@ -138,11 +136,11 @@ async def back_to_profile(callback_query: CallbackQuery, bot: Bot):
     except Exception as e:
         logger.warning(f"Ошибка удаления сообщения: {e}")
 
-    await profile_command(callback_query)
+    await profile_command(callback_query, user_profile)
     await callback_query.answer()
 
-@router.callback_query(lambda c: c.data == MenuCallbackData.action)
-async def main_menu_handler(callback_query: CallbackQuery, bot: Bot):
+@callbacks.handler(MenuCallbackData)
+async def main_menu_handler(callback_query: CallbackQuery, bot: Bot, user_role):
     logger.info(f"Callback 'back_to_menu' от пользователя {callback_query.from_user.id}")
     try:
         await bot.delete_message(chat_id=callback_query.message.chat.id, message_id=callback_query.message.message_id)
@@ -151,5 +149,5 @@ async def main_menu_handler(callback_query: CallbackQuery, bot: Bot):
         logger.warning(f"Ошибка удаления сообщения: {e}")
 
     from handlers.menu import show_menu
-    await show_menu(callback_query.message)
+    await show_menu(callback_query.message, user_role)
     await callback_query.answer()
\ No newline at end of file
@@ -12,15 +12,15 @@ import logging
 from aiogram import Router
 from aiogram.types import (
     Message, ReplyKeyboardMarkup, KeyboardButton,
-    ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, CallbackQuery
+    ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 )
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 
 from handlers.states import ProfileStates
-from utils.api_client import upsert_employee
-from utils.json_utils import load_locations
+from utils.employee_buffer import queue_employee_update
 from utils.course_plan import initialize_course_plan
+from utils.media_cache import send_cached_media
 from text import (
     INVALID_EMAIL, SEND_PHONE_NUMBER, USE_BUTTON_FOR_PHONE,
     INVALID_WARPOINT_LOCATION, REGISTRATION_SUCCESS_MESSAGE,
@@ -29,7 +29,7 @@ from text import (
 from aiogram import Router
 from aiogram.types import (
     Message, ReplyKeyboardMarkup, KeyboardButton,
-    ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, FSInputFile
+    ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 )
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
@@ -37,7 +37,7 @@ import datetime
 import logging
 
 from handlers.states import ProfileStates
-from utils.api_client import upsert_employee
+from utils.employee_buffer import queue_employee_update
 from utils.course_plan import initialize_course_plan
 from text import (
     CHOOSE_VR_ROOM, CHOOSE_VR_EXTREME, INVALID_VR_EXTREME,
@@ -48,11 +48,15 @@ from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery
 from handlers.states import ProfileStates
-from utils.api_client import upsert_employee, get_mentors
+from utils.api_client import get_mentors
+from utils.employee_buffer import queue_employee_update, flush_employee_updates
+from utils.callback_router import callbacks
+from handlers.callback_data import SelectMentorCallbackData, ToggleAttractionCallbackData, FinishSelectionCallbackData
+from utils.user_context import UserContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from handlers.states import ProfileStates
-from utils.api_client import upsert_employee
-from utils.json_utils import load_locations  # для списка городов
+from utils.employee_buffer import queue_employee_update
+from utils.location_index import get_location_index  # для списка городов
 from utils.course_plan import initialize_course_plan
 from text import (
     CHOOSE_POSITION_PROMPT, INVALID_POSITION,
@@ -73,7 +77,7 @@ async def start_registration(message: Message, state: FSMContext):
     user_id = message.from_user.id
 
     # создаём или обновляем профиль в Django API
-    await upsert_employee({'telegram_id': user_id})
+    await queue_employee_update({'telegram_id': user_id})
 
     await state.set_state(ProfileStates.position)
     keyboard = ReplyKeyboardMarkup(
@@ -96,7 +100,7 @@ async def enter_position(message: Message, state: FSMContext):
         return
 
     # обновляем должность через API
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': message.from_user.id,
         'position': choice,
         'role': 'Trainee',
@@ -111,7 +115,7 @@ async def enter_first_name(message: Message, state: FSMContext):
     user_id = message.from_user.id
     first_name = message.text.strip()
 
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'first_name': first_name,
     })
@@ -127,7 +131,7 @@ async def enter_last_name(message: Message, state: FSMContext):
     user_id = message.from_user.id
     last_name = message.text.strip()
 
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'last_name': last_name,
     })
@@ -148,11 +152,7 @@ async def handle_city_selection(message: Message, state: FSMContext):
     user_id = message.from_user.id
     city_info = message.text.strip()
 
-    # Получаем список из utils/json_utils
-    locations = load_locations()
-    valid_cities = [f"{loc['title']} {loc['city']} {loc['address']}" for loc in locations]
-
-    if city_info not in valid_cities:
+    if not get_location_index().is_valid_label(city_info):
         inline_kb = InlineKeyboardMarkup(
             inline_keyboard=[
                 [InlineKeyboardButton(text="Выбрать город", switch_inline_query_current_chat="")]
@@ -161,7 +161,7 @@ async def handle_city_selection(message: Message, state: FSMContext):
         await message.answer("Пожалуйста, выберите ваш город из списка:", reply_markup=inline_kb)
         return
 
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'city': city_info,
     })
@@ -179,13 +179,18 @@ async def show_mentors(message: Message, state: FSMContext):
     current_user_id = message.from_user.id
 
     # GET-запрос к API для получения списка менторов в этом городе
-    mentors_list = await get_mentors(city=selected_city, role="mentor")
+    try:
+        mentors_list = await get_mentors(city=selected_city, role="mentor")
+    except Exception as e:
+        # API недоступен и кэша нет — продолжаем регистрацию без выбора наставника
+        logger.error(f"Не удалось получить список наставников для города {selected_city}: {e}")
+        mentors_list = []
     # Отфильтруем себя, если вдруг попал в список
     mentors = [m for m in mentors_list if m["telegram_id"] != current_user_id]
 
     if not mentors:
         # Если наставников нет — сразу дёргаем следующий шаг
-        await upsert_employee({
+        await queue_employee_update({
             "telegram_id": current_user_id,
             "mentor": None
         })
@@ -198,7 +203,7 @@ async def show_mentors(message: Message, state: FSMContext):
             [
                 InlineKeyboardButton(
                     text=f"{m['first_name']} {m['last_name']}",
-                    callback_data=f"select_mentor:{m['telegram_id']}"
+                    callback_data=SelectMentorCallbackData(mentor_id=m['telegram_id']).pack()
                 )
             ]
             for m in mentors
@@ -207,16 +212,20 @@ async def show_mentors(message: Message, state: FSMContext):
     await message.answer("Выберите наставника из доступных:", reply_markup=keyboard)
 
 
-@router.callback_query(lambda c: c.data.startswith("select_mentor:"))
-async def select_mentor(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(SelectMentorCallbackData)
+async def select_mentor(callback: CallbackQuery, state: FSMContext, callback_data: SelectMentorCallbackData,
+                        user_context: UserContext):
     user_id = callback.from_user.id
-    mentor_id = int(callback.data.split(":", 1)[1])
+    mentor_id = callback_data.mentor_id
 
     # Обновляем профиль пользователя, записывая выбранного наставника
-    await upsert_employee({
+    await queue_employee_update({
         "telegram_id": user_id,
         "mentor": mentor_id
     })
+    # Поле mentor локального профиля — источник индекса наставник → стажёры
+    if user_context.exists:
+        user_context.update(mentor=mentor_id)
 
     await callback.answer("Наставник успешно выбран!")
     await state.set_state(ProfileStates.email)
@@ -240,7 +249,7 @@ async def enter_email(message: Message, state: FSMContext):
         return
 
     # Обновляем через API
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'email': email,
     })
@@ -273,7 +282,7 @@ async def enter_phone_number(message: Message, state: FSMContext):
 
     phone_number = message.contact.phone_number
     await state.update_data(phone_number=phone_number)
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'phone_number': phone_number,
     })
@@ -303,7 +312,7 @@ async def enter_warpoint_location(message: Message, state: FSMContext):
         return
 
     await state.update_data(warpoint_location=location)
-    await upsert_employee({
+    await queue_employee_update({
         'telegram_id': user_id,
         'warpoint_location': location,
     })
@@ -312,7 +321,7 @@ async def enter_warpoint_location(message: Message, state: FSMContext):
     # Если Arena — сразу завершаем
     if location == "Warpoint Arena":
         # Сбрасываем VR и attractions, формируем курс
-        await upsert_employee({
+        await queue_employee_update({
             'telegram_id': user_id,
             'vr_room': False,
             'vr_extreme': False,
@@ -323,9 +332,10 @@ async def enter_warpoint_location(message: Message, state: FSMContext):
         data = initialize_course_plan(data)
         # можно отправить init request, если нужно
         await state.clear()
+        await flush_employee_updates(user_id)
 
-        await message.answer_video(
-            video=FSInputFile("video/complete_start.MP4"),
+        await send_cached_media(
+            message.answer_video, "video", "video/complete_start.MP4",
             caption=REGISTRATION_SUCCESS_MESSAGE,
             parse_mode="Markdown",
             reply_markup=ReplyKeyboardRemove()
@@ -347,8 +357,8 @@ logger = logging.getLogger(__name__)
 ATTRACTION_NAMES = ["Twister", "VR-Helicopter", "VR-Eggs", "Emotion"]
 
 async def _update_user(data: dict):
-    """Helper to send updates to Django API."""
-    await upsert_employee(data)
+    """Helper to send updates to Django API (через буфер отложенной записи)."""
+    await queue_employee_update(data)
 
 def get_attractions_keyboard(attractions: dict) -> InlineKeyboardMarkup:
     buttons = []
@@ -357,9 +367,9 @@ def get_attractions_keyboard(attractions: dict) -> InlineKeyboardMarkup:
         icon = "✅" if status == "Да" else "❌"
         buttons.append([InlineKeyboardButton(
             text=f"{icon} {name}",
-            callback_data=f"toggle_attraction:{name}"
+            callback_data=ToggleAttractionCallbackData(name=name).pack()
         )])
-    buttons.append([InlineKeyboardButton(text="✅ Закончить выбор", callback_data="finish_selection")])
+    buttons.append([InlineKeyboardButton(text="✅ Закончить выбор", callback_data=FinishSelectionCallbackData().pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 # Ввод VR-Room
@@ -402,6 +412,7 @@ async def process_vr_extreme(message: Message, state: FSMContext):
         data['user_id'] = user_id
         full_plan = initialize_course_plan(data)
         await _update_user({'telegram_id': user_id, **full_plan})
+        await flush_employee_updates(user_id)
 
         await state.clear()
         await message.answer(REGISTRATION_COMPLETE, reply_markup=ReplyKeyboardRemove())
@@ -418,10 +429,10 @@ async def process_vr_extreme(message: Message, state: FSMContext):
         logger.info(f"Пользователь {user_id} переходит к выбору аттракционов")
 
 # Переключение аттракциона
-@router.callback_query(lambda c: c.data.startswith("toggle_attraction:"))
-async def toggle_attraction(callback: CallbackQuery, state: FSMContext):
+@callbacks.handler(ToggleAttractionCallbackData)
+async def toggle_attraction(callback: CallbackQuery, state: FSMContext, callback_data: ToggleAttractionCallbackData):
     user_id = callback.from_user.id
-    attraction = callback.data.split(":", 1)[1]
+    attraction = callback_data.name
     data = await state.get_data()
     attractions = data.get("attractions", {name: "Нет" for name in ATTRACTION_NAMES})
     attractions[attraction] = "Да" if attractions[attraction] == "Нет" else "Нет"
@@ -435,7 +446,7 @@ async def toggle_attraction(callback: CallbackQuery, state: FSMContext):
     logger.info(f"Пользователь {user_id} изменил выбор аттракциона {attraction} на {attractions[attraction]}")
 
 # Завершение выбора аттракционов
-@router.callback_query(lambda c: c.data == "finish_selection")
+@callbacks.handler(FinishSelectionCallbackData)
 async def finish_selection(callback: CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     data = await state.get_data()
@@ -450,13 +461,14 @@ async def finish_selection(callback: CallbackQuery, state: FSMContext):
     # Инициализируем курс
     full_plan = initialize_course_plan({**data, 'user_id': user_id})
     await _update_user({'telegram_id': user_id, **full_plan})
+    await flush_employee_updates(user_id)
 
     await state.clear()
     chat_id = callback.message.chat.id
     await callback.message.delete()
-    await callback.bot.send_video(
+    await send_cached_media(
+        callback.bot.send_video, "video", "video/complete_start.MP4",
         chat_id=chat_id,
-        video=FSInputFile("video/complete_start.MP4"),
         caption=REGISTRATION_SUCCESS_MESSAGE,
         parse_mode="Markdown"
     )
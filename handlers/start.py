@@ -1,9 +1,11 @@
 import os
 import logging
 from aiogram import Router
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, CallbackQuery
+from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
-from utils.json_utils import load_from_json
+from utils.media_cache import send_cached_media
+from utils.callback_router import callbacks
+from handlers.callback_data import StartRegistrationCallbackData
 from text import START_ALREADY_REGISTERED, START_MESSAGE
 from handlers.registration import start_registration  # Импортируем функцию регистрации
 
@@ -12,11 +14,11 @@ logger = logging.getLogger(__name__)
 
 # Команда /start
 @router.message(Command("start"))
-async def start_command(message: Message):
+async def start_command(message: Message, user_context):
     user_id = message.from_user.id
     logger.info(f"Команда /start от пользователя {user_id}")
 
-    if load_from_json(user_id):
+    if user_context.exists:
         await message.answer(START_ALREADY_REGISTERED)
         logger.info(f"Пользователь {user_id} уже зарегистрирован")
         return
@@ -24,14 +26,14 @@ async def start_command(message: Message):
     # Создаем инлайн-клавиатуру с кнопкой "Начать регистрацию"
     inline_keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Начать регистрацию", callback_data="start_registration")]
+            [InlineKeyboardButton(text="Начать регистрацию", callback_data=StartRegistrationCallbackData().pack())]
         ]
     )
 
     image_path = os.path.join("images", "start.jpg")
     if os.path.exists(image_path):
-        await message.answer_photo(
-            photo=FSInputFile(image_path),
+        await send_cached_media(
+            message.answer_photo, "photo", image_path,
             caption=START_MESSAGE,
             reply_markup=inline_keyboard
         )
@@ -41,7 +43,7 @@ async def start_command(message: Message):
         logger.warning(f"Изображение {image_path} не найдено для пользователя {user_id}")
 
 # Обработчик инлайн-кнопки "Начать регистрацию"
-@router.callback_query(lambda c: c.data == "start_registration")
+@callbacks.handler(StartRegistrationCallbackData)
 async def start_registration_callback(callback: CallbackQuery, state):
     """
     Обработчик нажатия кнопки "Начать регистрацию".
@@ -6,9 +6,12 @@ from aiogram import Dispatcher, types, Router, Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
-from main import bot
-from utils.json_utils import load_training_data, load_user_data, save_user_data
+from bot_instance import bot
+from utils.json_utils import load_training_data_async
+from utils.user_context import UserContext
 from utils.bot_utils import send_message_or_photo
+from utils.callback_router import callbacks
+from handlers.callback_data import TestAnswerCallbackData
 from handlers.states import TestStates
 from text import (
     TEST_ALREADY_COMPLETED, PROFILE_NOT_FOUND, TEST_ERROR_DATA_NOT_FOUND, TEST_COMPLETED,
@@ -26,18 +29,19 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 # Отправка вопросов теста
-async def send_test_question(user_id, chat_id, section, test_name, question_number, state: FSMContext):
-    training_data = load_training_data()
-    test_data = training_data.get(section, {}).get(test_name, {})
+async def send_test_question(user_id, chat_id, section, test_name, question_number, state: FSMContext,
+                             user_context: UserContext):
+    training_data = await load_training_data_async()
+    test_data = training_data.lesson(section, test_name)
+    question_data = test_data.question(question_number) if test_data else None
 
-    if f"Вопрос {question_number}" not in test_data:
+    if question_data is None:
         logger.info(f"Нет вопроса 'Вопрос {question_number}' в тесте {test_name} для пользователя {user_id}. Завершаем тест.")
-        return await finish_test(user_id, chat_id, section, test_name, state)
+        return await finish_test(user_id, chat_id, section, test_name, state, user_context)
 
-    question_data = test_data[f"Вопрос {question_number}"]
-    text = question_data["text"]
-    image = question_data.get("image", None)
-    correct_answer = question_data["correct_answer"]
+    text = question_data.text
+    image = question_data.image
+    correct_answer = question_data.correct_answer
 
     # Сохраняем текущий вопрос в state
     await state.update_data(
@@ -50,18 +54,19 @@ async def send_test_question(user_id, chat_id, section, test_name, question_numb
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="1️⃣", callback_data="answer_1")],
-            [InlineKeyboardButton(text="2️⃣", callback_data="answer_2")],
-            [InlineKeyboardButton(text="3️⃣", callback_data="answer_3")],
-            [InlineKeyboardButton(text="4️⃣", callback_data="answer_4")]
+            [InlineKeyboardButton(text="1️⃣", callback_data=TestAnswerCallbackData(answer=1).pack())],
+            [InlineKeyboardButton(text="2️⃣", callback_data=TestAnswerCallbackData(answer=2).pack())],
+            [InlineKeyboardButton(text="3️⃣", callback_data=TestAnswerCallbackData(answer=3).pack())],
+            [InlineKeyboardButton(text="4️⃣", callback_data=TestAnswerCallbackData(answer=4).pack())]
         ]
     )
 
     await send_message_or_photo(chat_id, text, image, keyboard)
 
 # Обработчик ответа пользователя на вопрос теста
-@router.callback_query(lambda call: call.data.startswith("answer_"))
-async def check_answer(call: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(TestAnswerCallbackData)
+async def check_answer(call: types.CallbackQuery, state: FSMContext, callback_data: TestAnswerCallbackData,
+                       user_context: UserContext):
     logger.info(f"Получен ответ {call.data} от пользователя {call.from_user.id}")
 
     data = await state.get_data()
@@ -75,15 +80,15 @@ async def check_answer(call: types.CallbackQuery, state: FSMContext):
     test_name = data["test_name"]
     question_number = int(data["question_number"])  # Текущий вопрос
     correct_answer = int(data["correct_answer"])
-    user_answer = int(call.data.split("_")[1])
+    user_answer = callback_data.answer
 
-    user_data = load_user_data(user_id)
-    if not user_data:
+    if not user_context.exists:
         logger.warning(f"Профиль пользователя {user_id} не найден")
         return await bot.send_message(chat_id, "Профиль не найден.")
 
-    training_data = load_training_data()
-    test_data = training_data.get(section, {}).get(test_name, {})
+    training_data = await load_training_data_async()
+    test_data = training_data.lesson(section, test_name)
+    question_count = test_data.question_count if test_data else 0
     correct_answers = data.get("correct_answers", 0)
     incorrect_answers = data.get("incorrect_answers", [])
 
@@ -91,22 +96,19 @@ async def check_answer(call: types.CallbackQuery, state: FSMContext):
         correct_answers += 1
         logger.info(f"Пользователь {user_id} дал правильный ответ на вопрос {question_number}")
     else:
-        question_data = test_data.get(f"Вопрос {question_number}", {})
+        question_data = test_data.question(question_number) if test_data else None
         mistake_entry = {
             "section": section,
             "test_name": test_name,
-            "question_text": question_data.get("text", "Нет текста вопроса"),
-            "correct_answer": question_data.get("correct_answer", "Неизвестно"),
-            "quest": question_data.get("quest", "Нет дополнительного задания"),
+            "question_text": question_data.text if question_data else "Нет текста вопроса",
+            "correct_answer": question_data.correct_answer if question_data else "Неизвестно",
+            "quest": question_data.quest if question_data else "Нет дополнительного задания",
             "quest_status": "not completed"  # Добавляем статус задания
         }
         incorrect_answers.append(mistake_entry)
 
-        # Сохраняем неверный ответ в профиль пользователя
-        if "mistakes" not in user_data:
-            user_data["mistakes"] = []
-        user_data["mistakes"].append(mistake_entry)
-        save_user_data(user_id, user_data)
+        # Сохраняем неверный ответ в профиль пользователя (запись — в конце апдейта)
+        user_context.add_mistake(mistake_entry)
 
         logger.info(f"Пользователь {user_id} дал неверный ответ на вопрос {question_number}. Добавлено в mistakes.")
 
@@ -119,18 +121,17 @@ async def check_answer(call: types.CallbackQuery, state: FSMContext):
         logger.warning(f"Ошибка удаления сообщения: {e}")
 
     next_question_number = question_number + 1
-    next_question_key = f"Вопрос {next_question_number}"
 
-    if next_question_key in test_data:
-        await send_test_question(user_id, chat_id, section, test_name, next_question_number, state)
+    if next_question_number <= question_count:
+        await send_test_question(user_id, chat_id, section, test_name, next_question_number, state, user_context)
     else:
-        await finish_test(user_id, chat_id, section, test_name, state)
+        await finish_test(user_id, chat_id, section, test_name, state, user_context)
 
 # Завершение теста
-async def finish_test(user_id, chat_id, section, test_name, state: FSMContext):
+async def finish_test(user_id, chat_id, section, test_name, state: FSMContext, user_context: UserContext):
     logger.info(f"Завершение теста '{test_name}' для пользователя {user_id}")
 
-    user_data = load_user_data(user_id)
+    user_data = user_context.profile
     if not user_data:
         logger.warning(f"Профиль пользователя {user_id} не найден при завершении теста")
         return await bot.send_message(chat_id, "Профиль не найден.")
@@ -141,24 +142,20 @@ async def finish_test(user_id, chat_id, section, test_name, state: FSMContext):
             logger.info(f"Тест '{test_name}' уже завершён.")
             return
 
-    training_data = load_training_data()
-    test_data = training_data.get(section, {}).get(test_name, {})
-    total_questions = len(test_data)
+    training_data = await load_training_data_async()
+    test_data = training_data.lesson(section, test_name)
+    total_questions = test_data.question_count if test_data else 0
 
     data = await state.get_data()
     correct_answers = data.get("correct_answers", 0)
     incorrect_answers = data.get("incorrect_answers", [])
 
-    # Обновляем статус теста и сохраняем результаты
-    for lesson in user_data["course_plan"].get(section, []):
-        if lesson["title"] == test_name:
-            lesson["status"] = "completed"
-            lesson["total_questions"] = total_questions
-            lesson["correct_answers"] = correct_answers
-            break  
-
-    user_data["warcoin"] = user_data.get("warcoin", 0) + correct_answers
-    save_user_data(user_id, user_data)
+    # Обновляем статус теста и начисляем warcoin; профиль записывается в конце апдейта
+    user_context.update_lesson(
+        section, test_name,
+        status="completed", total_questions=total_questions, correct_answers=correct_answers,
+    )
+    user_context.update(warcoin=user_data.get("warcoin", 0) + correct_answers)
 
     # Сообщение с результатами теста
     completion_message = (
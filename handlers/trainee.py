@@ -1,26 +1,32 @@
 import logging
 from aiogram import Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from utils.json_utils import load_from_json, save_user_data
+from utils.json_utils import load_from_json_async, update_user_data_async, user_lock, get_mentor_id_async
 from bot_instance import bot
+from utils.rate_limiter import outbound_priority, NOTIFICATION
+from utils.session_expiry import session_expiry
+from utils import attestation
+from utils.callback_router import callbacks
+from handlers.callback_data import StartTestCallbackData, FinalAnswerCallbackData
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-# Переменные для хранения временных данных
-active_tests = {}  # Словарь для хранения данных о текущем тестировании (в памяти)
+# Прогресс аттестации хранится в utils.attestation; брошенные аттестации
+# выгружаются из памяти и удаляются из базы после SESSION_TTL секунд простоя
+session_expiry.register("attestation", attestation.unload)
 
 # Команда /attestatsiya
 @router.message(lambda message: message.text == "/attestatsiya")
-async def start_attestation(message: Message):
+async def start_attestation(message: Message, user_profile):
     """
     Команда /attestatsiya для начала итогового тестирования.
     Проверяем доступ к тестированию.
     """
     user_id = message.from_user.id
 
-    # Загружаем профиль стажера
-    trainee_data = load_from_json(user_id)
+    # Профиль стажера загружен UserProfileMiddleware
+    trainee_data = user_profile
     if not trainee_data:
         logger.warning(f"Данные стажера с ID {user_id} не найдены.")
         return
@@ -42,21 +48,21 @@ async def start_attestation(message: Message):
         "Чтобы начать тестирование, нажмите кнопку «Начать» ниже.",
         reply_markup=InlineKeyboardMarkup(
             inline_keyboard=[
-                [InlineKeyboardButton(text="Начать", callback_data="start_test")]
+                [InlineKeyboardButton(text="Начать", callback_data=StartTestCallbackData().pack())]
             ]
         )
     )
 
 # Кнопка "Начать"
-@router.callback_query(lambda c: c.data == "start_test")
-async def handle_start_test(callback: CallbackQuery):
+@callbacks.handler(StartTestCallbackData)
+async def handle_start_test(callback: CallbackQuery, user_profile):
     """
     Обработчик кнопки "Начать". Начинаем тестирование.
     """
     user_id = callback.from_user.id
 
-    # Загружаем профиль стажера
-    trainee_data = load_from_json(user_id)
+    # Профиль стажера загружен UserProfileMiddleware
+    trainee_data = user_profile
     if not trainee_data:
         await callback.message.delete()
         logger.warning(f"Данные стажера с ID {user_id} не найдены.")
@@ -77,43 +83,31 @@ async def handle_start_test(callback: CallbackQuery):
         await callback.message.edit_text("У вас нет вопросов для тестирования.")
         return
 
-    # Сохраняем данные о текущем тесте в памяти
-    active_tests[user_id] = {
-        "questions": mistakes,
-        "current_index": 0,
-        "errors": []
-    }
+    # Сохраняем прогресс аттестации
+    session = await attestation.start(user_id, mistakes)
+    session_expiry.touch("attestation", user_id)
 
     # Отображаем первый вопрос
-    await send_question(callback, user_id)
+    await send_question(callback, session)
 
-async def send_question(callback: CallbackQuery, user_id: int):
+async def send_question(callback: CallbackQuery, session):
     """
     Отображает текущий вопрос тестирования.
     """
-    test_data = active_tests.get(user_id)
-    if not test_data:
-        await callback.message.delete()
-        logger.warning(f"Тестирование для стажера {user_id} неактивно.")
-        return
-
-    current_index = test_data["current_index"]
-    questions = test_data["questions"]
-
     # Проверяем, есть ли еще вопросы
-    if current_index >= len(questions):
-        await show_test_results(callback, user_id)
+    if session.finished:
+        await show_test_results(callback, session.user_id)
         return
 
     # Получаем текущий вопрос
-    question_data = questions[current_index]
+    current_index = session.index
+    question_data = session.current_question
     question_text = question_data.get("question_text", "Вопрос отсутствует.")
-    correct_answer = question_data.get("correct_answer", 1)
 
-    # Формируем кнопки для вариантов ответа
+    # Формируем кнопки для вариантов ответа; правильный ответ остаётся на сервере
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text=str(i), callback_data=f"answer:{i}:{correct_answer}")]
+            [InlineKeyboardButton(text=str(i), callback_data=FinalAnswerCallbackData(question_index=current_index, answer=i).pack())]
             for i in range(1, 5)
         ]
     )
@@ -125,50 +119,44 @@ async def send_question(callback: CallbackQuery, user_id: int):
     )
 
 # Обработчик ответа на вопрос
-@router.callback_query(lambda c: c.data.startswith("answer:"))
-async def handle_answer(callback: CallbackQuery):
+@callbacks.handler(FinalAnswerCallbackData)
+async def handle_answer(callback: CallbackQuery, callback_data: FinalAnswerCallbackData):
     """
     Обрабатывает ответ на вопрос.
     """
     user_id = callback.from_user.id
-    if user_id not in active_tests:
+    question_index, selected_answer = callback_data.question_index, callback_data.answer
+
+    session = await attestation.get(user_id)
+    if session is None:
         await callback.message.delete()
         logger.warning(f"Тестирование для стажера {user_id} неактивно.")
         return
+    if question_index != session.index and not session.finished:
+        # Повторное нажатие на кнопку уже отвеченного вопроса
+        await callback.answer()
+        return
 
-    _, selected_answer, correct_answer = callback.data.split(":")
-    selected_answer = int(selected_answer)
-    correct_answer = int(correct_answer)
-
-    # Проверяем правильность ответа
-    test_data = active_tests[user_id]
-    current_index = test_data["current_index"]
-    questions = test_data["questions"]
-
-    if current_index < len(questions):
-        question_data = questions[current_index]
-        if selected_answer != correct_answer:
-            # Если ответ неверный, добавляем задание в список ошибок
-            test_data["errors"].append(question_data)
-
-    # Переходим к следующему вопросу
-    test_data["current_index"] += 1
+    # Проверяем ответ и переходим к следующему вопросу
+    session = await attestation.answer(user_id, question_index, selected_answer)
+    session_expiry.touch("attestation", user_id)
 
     # Показ следующего вопроса
-    await send_question(callback, user_id)
+    await send_question(callback, session)
 
 async def show_test_results(callback: CallbackQuery, user_id: int):
     """
     Отображает результаты тестирования и уведомляет наставника.
     """
-    if user_id not in active_tests:
+    session = await attestation.finish(user_id)  # Удаляем прогресс аттестации
+    session_expiry.discard("attestation", user_id)
+    if session is None:
         await callback.message.delete()
         logger.warning(f"Тестирование для стажера {user_id} неактивно.")
         return
 
-    test_data = active_tests.pop(user_id)  # Удаляем данные теста из памяти
-    questions = test_data["questions"]
-    errors = test_data["errors"]
+    questions = session.questions
+    errors = session.error_questions()
 
     num_questions = len(questions)
     num_errors = len(errors)
@@ -189,8 +177,8 @@ async def show_test_results(callback: CallbackQuery, user_id: int):
     await callback.message.edit_text(result_message)
 
     # Уведомляем наставника
-    trainee_data = load_from_json(user_id)
-    mentor_id = trainee_data.get("mentor", {}).get("id")
+    trainee_data = await load_from_json_async(user_id) or {}
+    mentor_id = await get_mentor_id_async(user_id)
     if mentor_id:
         try:
             # Формируем сообщение для наставника
@@ -206,11 +194,12 @@ async def show_test_results(callback: CallbackQuery, user_id: int):
                     mentor_message += f"- {task.get('quest', 'Не указано')}\n"
 
             # Отправляем сообщение наставнику
-            await bot.send_message(mentor_id, mentor_message)
+            with outbound_priority(NOTIFICATION):
+                await bot.send_message(mentor_id, mentor_message)
         except Exception as e:
             logger.error(f"Не удалось отправить сообщение наставнику с ID {mentor_id}: {e}")
 
     # Удаляем строку "final_test_ready" из JSON
     if "final_test_ready" in trainee_data:
-        del trainee_data["final_test_ready"]
-        save_user_data(user_id, trainee_data)
\ No newline at end of file
+        async with user_lock(user_id):
+            await update_user_data_async(user_id, fields={"final_test_ready": None})
\ No newline at end of file
@@ -7,10 +7,13 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
 from bot_instance import bot
 from .tests import send_test_question
-from utils.json_utils import load_training_data, load_user_data, save_user_data
+from utils.json_utils import load_training_data_async
+from utils.user_context import UserContext
 from utils.bot_utils import send_message_or_photo
 from utils.course_plan import initialize_course_plan
 from utils import bot_utils
+from utils.callback_router import callbacks
+from handlers.callback_data import TrainingCallbackData, NextLessonCallbackData
 from text import (
     LEARN_PROFILE_NOT_FOUND, SECTION_DATA_NOT_FOUND, LESSON_MATERIAL_NOT_FOUND,
     TRAINING_COMPLETE, NEXT_LESSON_ERROR_PROFILE_NOT_FOUND
@@ -26,19 +29,18 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 @router.message(Command("learn"))
-async def start_learning(message: types.Message, state: FSMContext):
+async def start_learning(message: types.Message, state: FSMContext, user_context: UserContext):
     user_id = message.from_user.id
-    user_data = load_user_data(user_id)
 
-    if not user_data:
+    if not user_context.exists:
         logger.warning("Профиль пользователя %s не найден при запуске обучения", user_id)
         await message.answer(LEARN_PROFILE_NOT_FOUND)
         return
 
-    await send_lesson(user_id, message.chat.id, state)
+    await send_lesson(user_id, message.chat.id, state, user_context)
 
-@router.callback_query(lambda c: c.data == "training")
-async def training_handler(callback_query: types.CallbackQuery, bot: Bot, state: FSMContext):
+@callbacks.handler(TrainingCallbackData)
+async def training_handler(callback_query: types.CallbackQuery, bot: Bot, state: FSMContext, user_context: UserContext):
     logger.info("Callback 'training' получен от пользователя %s", callback_query.from_user.id)
     try:
         await bot.delete_message(
@@ -51,32 +53,33 @@ async def training_handler(callback_query: types.CallbackQuery, bot: Bot, state:
 
     # Ленивый импорт для избежания циклических зависимостей
     from .training import start_learning
-    await start_learning(callback_query, state)
+    await start_learning(callback_query, state, user_context)
     await callback_query.answer()
 
-async def start_learning(callback_query: types.CallbackQuery, state: FSMContext):
+async def start_learning(callback_query: types.CallbackQuery, state: FSMContext, user_context: UserContext):
     user_id = callback_query.from_user.id
-    user_data = load_user_data(user_id)
 
-    if not user_data:
+    if not user_context.exists:
         logger.warning("Профиль пользователя %s не найден при запуске обучения (callback)", user_id)
         await callback_query.message.answer(LEARN_PROFILE_NOT_FOUND)
         return
 
-    await send_lesson(user_id, callback_query.message.chat.id, state)
+    await send_lesson(user_id, callback_query.message.chat.id, state, user_context)
 
 # Отправка следующего урока или теста
-async def send_lesson(user_id, chat_id, state: FSMContext, message_id=None):
-    user_data = load_user_data(user_id)
+async def send_lesson(user_id, chat_id, state: FSMContext, user_context: UserContext, message_id=None):
+    # Профиль уже прочитан middleware и содержит изменения этого апдейта
+    user_data = user_context.profile
     if not user_data:
         logger.warning("Профиль пользователя %s не найден при отправке урока", user_id)
         return await bot.send_message(chat_id, LEARN_PROFILE_NOT_FOUND)
 
     course_plan = user_data.get("course_plan", {})
-    training_data = load_training_data()
+    training_data = await load_training_data_async()
 
     for section, lessons in course_plan.items():
-        if section not in training_data:
+        section_data = training_data.section(section)
+        if section_data is None:
             logger.error("Данные раздела '%s' не найдены в обучающих материалах", section)
             return await bot.send_message(chat_id, SECTION_DATA_NOT_FOUND.format(section=section))
 
@@ -85,21 +88,21 @@ async def send_lesson(user_id, chat_id, state: FSMContext, message_id=None):
                 lesson_name = lesson["title"]
 
                 # Проверяем, является ли это тестом
-                if lesson_name in training_data[section] and "Вопрос 1" in training_data[section][lesson_name]:
+                lesson_data = section_data.get(lesson_name)
+                if lesson_data is not None and lesson_data.is_test:
                     logger.info("Отправка теста '%s' пользователю %s", lesson_name, user_id)
-                    return await send_test_question(user_id, chat_id, section, lesson_name, 1, state)
+                    return await send_test_question(user_id, chat_id, section, lesson_name, 1, state, user_context)
 
-                lesson_data = training_data[section].get(lesson_name)
-                if not lesson_data:
+                if lesson_data is None:
                     logger.error("Материал урока '%s' не найден", lesson_name)
                     return await bot.send_message(chat_id, LESSON_MATERIAL_NOT_FOUND.format(lesson_name=lesson_name))
 
-                text = lesson_data.get("text", "Материал отсутствует.")
-                image = lesson_data.get("image", None)
+                text = lesson_data.text or "Материал отсутствует."
+                image = lesson_data.image
 
                 keyboard = InlineKeyboardMarkup(
                     inline_keyboard=[
-                        [InlineKeyboardButton(text="➡ Далее", callback_data=f"next_{section}_{lesson_name}")]
+                        [InlineKeyboardButton(text="➡ Далее", callback_data=NextLessonCallbackData(section=section, lesson=lesson_name).pack())]
                     ]
                 )
 
@@ -117,31 +120,20 @@ async def send_lesson(user_id, chat_id, state: FSMContext, message_id=None):
     logger.info("Обучение завершено для пользователя %s", user_id)
     await bot.send_message(chat_id, TRAINING_COMPLETE)
 
-@router.callback_query(lambda call: call.data.startswith("next_"))
-async def next_lesson(call: types.CallbackQuery, state: FSMContext):
+@callbacks.handler(NextLessonCallbackData)
+async def next_lesson(call: types.CallbackQuery, state: FSMContext, callback_data: NextLessonCallbackData,
+                      user_context: UserContext):
     logger.info("Callback 'next_lesson' вызван от пользователя %s с данными: %s", call.from_user.id, call.data)
-
-    try:
-        _, section, lesson_name = call.data.split("_", 2)
-    except Exception as e:
-        logger.error("Ошибка обработки callback data: %s", e)
-        return
+    section, lesson_name = callback_data.section, callback_data.lesson
 
     user_id = call.from_user.id
-    user_data = load_user_data(user_id)
-    if not user_data:
+    # Обновляем статус текущего урока; запись в профиль — в конце апдейта
+    if not user_context.exists:
         logger.warning("Профиль пользователя %s не найден при переходе к следующему уроку", user_id)
         await call.answer(NEXT_LESSON_ERROR_PROFILE_NOT_FOUND, show_alert=True)
         return
-
-    # Обновляем статус текущего урока
-    for lesson in user_data["course_plan"].get(section, []):
-        if lesson["title"] == lesson_name:
-            lesson["status"] = "completed"
-            logger.info("Урок '%s' завершен для пользователя %s", lesson_name, user_id)
-            break
-
-    save_user_data(user_id, user_data)
+    user_context.update_lesson(section, lesson_name, status="completed")
+    logger.info("Урок '%s' завершен для пользователя %s", lesson_name, user_id)
 
     # Удаляем старое сообщение (проверяем на ошибки)
     try:
@@ -152,4 +144,4 @@ async def next_lesson(call: types.CallbackQuery, state: FSMContext):
 
     # Переход к следующему уроку
     logger.info("Отправка следующего урока пользователю %s", user_id)
-    await send_lesson(user_id, call.message.chat.id, state)
\ No newline at end of file
+    await send_lesson(user_id, call.message.chat.id, state, user_context)
\ No newline at end of file
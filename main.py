@@ -4,11 +4,22 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config import API_TOKEN
+from aiogram import Dispatcher
+from config import FSM_DB_FILE, WEBHOOK_URL
 from handlers import commands, mentor, profile, training, tests, feedback, menu, start, inline_handler, registration, trainee, manager
 from bot_instance import bot
+from utils.training_content import get_training_content
+from utils.fsm_storage import SQLiteStorage
+from utils.session_expiry import session_expiry, track_fsm_storage, SessionActivityMiddleware
+from utils.media_prewarm import start_media_prewarm, stop_media_prewarm
+from utils.api_client import api_client
+from utils.employee_outbox import employee_outbox
+from utils.webhook import run_webhook
+from utils.chat_dispatch import ChatSequentialMiddleware
+from utils.callback_router import callbacks, check_callback_routing
+from utils.user_context import UserProfileMiddleware
+from utils.json_utils import migrate_legacy_trainees_async
+from utils import attestation
 
 # Определяем базовую папку (папку, где находится main.py)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -29,12 +40,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Инициализация бота, хранилища и диспетчера
-bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+# Инициализация хранилища и диспетчера (бот — общий, из bot_instance)
+storage = SQLiteStorage(FSM_DB_FILE)
 dp = Dispatcher(storage=storage)
+dp.update.outer_middleware(SessionActivityMiddleware())
+dp.update.outer_middleware(ChatSequentialMiddleware())
+# Профиль пользователя читается один раз на апдейт, изменения пишутся в конце
+dp.update.outer_middleware(UserProfileMiddleware())
+track_fsm_storage(storage)
+dp.startup.register(migrate_legacy_trainees_async)
+dp.startup.register(attestation.purge_expired)
+dp.startup.register(session_expiry.start)
+dp.shutdown.register(session_expiry.stop)
+dp.startup.register(start_media_prewarm)
+dp.shutdown.register(stop_media_prewarm)
+dp.startup.register(api_client.startup)
+dp.startup.register(employee_outbox.start)
+# Очередь изменений профилей останавливается до закрытия сессии API;
+# неотправленное (в том числе придержанное) уйдёт после перезапуска
+dp.shutdown.register(employee_outbox.stop)
+dp.shutdown.register(api_client.shutdown)
 
 def register_handlers():
+    # Все нажатия inline-кнопок разбираются одним маршрутизатором по префиксу
+    dp.include_router(callbacks.router)
     dp.include_router(inline_handler.router)
     dp.include_router(start.router)
     dp.include_router(registration.router)
@@ -51,9 +80,17 @@ def register_handlers():
 async def main():
     try:
         register_handlers()
+        await check_callback_routing(dp)
+        get_training_content()
         logger.info("Запуск успешно")
         await commands.set_commands(bot)
-        await dp.start_polling(bot)
+        if WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            # Переход с webhook обратно на polling: Telegram не отдаёт
+            # обновления через getUpdates, пока webhook установлен
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
         logger.error("Ошибка: %s", e)
 
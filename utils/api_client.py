@@ -1,5 +1,10 @@
 import os
+import time
+import random
+import asyncio
+import logging
 import aiohttp
+from collections import deque
 
 # URL вашего API (можно брать из .env или задавать здесь)
 API_URL = os.getenv('API_URL', 'http://192.168.0.249:8000/api/employees/')
@@ -7,25 +12,286 @@ API_URL = os.getenv('API_URL', 'http://192.168.0.249:8000/api/employees/')
 # Замените '<YOUR_TOKEN_HERE>' на реальный токен или задайте через переменные окружения
 API_TOKEN = os.getenv('API_TOKEN', 'bf685ad3a4485265532a88de9ef1829143a9c747')
 
+# Ограничения пула соединений и общий таймаут запроса к API, секунды
+API_CONNECTION_LIMIT = int(os.getenv('API_CONNECTION_LIMIT', '20'))
+API_KEEPALIVE_TIMEOUT = float(os.getenv('API_KEEPALIVE_TIMEOUT', '60'))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', '10'))
+# Таймауты отдельных запросов: запись профиля и список наставников
+API_UPSERT_TIMEOUT = float(os.getenv('API_UPSERT_TIMEOUT', '5'))
+API_MENTORS_TIMEOUT = float(os.getenv('API_MENTORS_TIMEOUT', '3'))
+# Повторы при сетевых ошибках, таймаутах и ответах 5xx/429: число повторов
+# и базовая задержка (полный разброс от 0 до base * 2^попытка), секунды
+API_RETRIES = int(os.getenv('API_RETRIES', '2'))
+API_RETRY_BASE = float(os.getenv('API_RETRY_BASE', '0.3'))
+# Автомат защиты: доля ошибок среди последних API_BREAKER_WINDOW запросов
+# (не меньше API_BREAKER_MIN_CALLS), при которой запросы к API прекращаются
+# на API_BREAKER_RESET секунд
+API_BREAKER_WINDOW = int(os.getenv('API_BREAKER_WINDOW', '20'))
+API_BREAKER_MIN_CALLS = int(os.getenv('API_BREAKER_MIN_CALLS', '5'))
+API_BREAKER_THRESHOLD = float(os.getenv('API_BREAKER_THRESHOLD', '0.5'))
+API_BREAKER_RESET = float(os.getenv('API_BREAKER_RESET', '30'))
+
+# Кэш списков наставников: сколько секунд список считается свежим и сколько
+# ещё можно отдавать устаревший список, пока в фоне запрашивается новый
+MENTORS_CACHE_TTL = float(os.getenv('MENTORS_CACHE_TTL', '300'))
+MENTORS_CACHE_STALE = float(os.getenv('MENTORS_CACHE_STALE', '1800'))
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """API считается недоступным: автомат защиты разомкнут."""
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты по доле ошибок в скользящем окне последних запросов.
+    closed — запросы идут; open — запросы сразу отклоняются до истечения
+    reset_timeout; half_open — пропускается один пробный запрос, по его
+    результату автомат замыкается или снова размыкается. Пробный запрос
+    помечается меткой из before_request: результаты запросов, начатых до
+    размыкания, на состояние разомкнутого автомата не влияют.
+    """
+
+    def __init__(self, window=API_BREAKER_WINDOW, min_calls=API_BREAKER_MIN_CALLS,
+                 threshold=API_BREAKER_THRESHOLD, reset_timeout=API_BREAKER_RESET):
+        self.min_calls = min_calls
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._results = deque(maxlen=window)
+        self._opened_at = None
+        self._probe = None
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def retry_after(self):
+        """Через сколько секунд автомат пропустит пробный запрос (0 — уже пропускает)."""
+        if self._opened_at is None:
+            return 0
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def allows_request(self):
+        state = self.state
+        return state == "closed" or (state == "half_open" and self._probe is None)
+
+    def before_request(self):
+        """Метка пробного запроса или None, если автомат замкнут."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probe is not None):
+            raise CircuitOpenError(f"API сотрудников недоступен, повтор через {self.retry_after():.0f} с")
+        if state == "half_open":
+            self._probe = object()
+        return self._probe
+
+    def release(self, probe):
+        """Снимает метку пробного запроса, завершившегося без результата (например, отменённого)."""
+        if probe is not None and probe is self._probe:
+            self._probe = None
+
+    def record(self, success, probe=None):
+        if self._opened_at is not None:
+            # Пока автомат разомкнут, учитывается только результат пробного запроса
+            if probe is None or probe is not self._probe:
+                return
+            self._probe = None
+            if success:
+                self._opened_at = None
+                self._results.clear()
+                logger.info("Автомат защиты API замкнут: API снова отвечает")
+            else:
+                self._opened_at = time.monotonic()
+            return
+        self._results.append(success)
+        failures = self._results.count(False)
+        if len(self._results) >= self.min_calls and failures / len(self._results) >= self.threshold:
+            self._opened_at = time.monotonic()
+            logger.warning(
+                "Автомат защиты API разомкнут: %s ошибок из %s запросов, пауза %s с",
+                failures, len(self._results), self.reset_timeout,
+            )
+
+
+def _is_retryable(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status in (408, 429)
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+class AsyncTTLCache:
+    """
+    Асинхронный кэш с TTL. Одновременные промахи по одному ключу ждут один
+    общий запрос. Устаревшее (но не старше ttl + stale) значение отдаётся
+    сразу, а обновляется в фоне; если запрос не удался, отдаётся последнее
+    известное значение.
+    """
+
+    def __init__(self, ttl, stale):
+        self.ttl = ttl
+        self.stale = stale
+        self._entries = {}
+        self._inflight = {}
+
+    def _refresh(self, key, fetch):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._store(key, done))
+        return task
+
+    def _store(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning("Не удалось обновить кэш %s: %s", key, task.exception())
+            return
+        self._entries[key] = (task.result(), time.monotonic())
+
+    async def get(self, key, fetch):
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry[1] if entry is not None else None
+        if entry is not None and age < self.ttl:
+            return entry[0]
+        if entry is not None and age < self.ttl + self.stale:
+            self._refresh(key, fetch)
+            return entry[0]
+        try:
+            # shield: отмена одного ожидающего не прерывает общий запрос
+            return await asyncio.shield(self._refresh(key, fetch))
+        except Exception:
+            if entry is None:
+                raise
+            logger.warning("API недоступен, используется сохранённое значение %s", key)
+            return entry[0]
+
+    def invalidate(self, predicate=None):
+        """
+        Помечает устаревшими значения, для которых predicate(key, value) истинно
+        (по умолчанию — все). Следующий запрос пойдёт в API, а старое значение
+        останется запасным на случай ошибки.
+        """
+        for key, (value, _) in list(self._entries.items()):
+            if predicate is None or predicate(key, value):
+                self._entries[key] = (value, float("-inf"))
+
+
+def _is_mentor_update(key, mentors, data):
+    # Список города устаревает, если изменилась запись наставника из него
+    # или кто-то получил роль наставника
+    telegram_id = data.get('telegram_id')
+    if any(mentor.get('telegram_id') == telegram_id for mentor in mentors):
+        return True
+    return str(data.get('role', '')).lower() == key[1].lower()
+
+
+class EmployeeApiClient:
+    """
+    Клиент API сотрудников с одной сессией aiohttp на весь процесс:
+    соединения переиспользуются (keep-alive), а не открываются на каждый запрос.
+    Сессия создаётся в startup() (или при первом запросе) и закрывается в shutdown().
+    """
+
+    def __init__(self, base_url=API_URL, token=API_TOKEN, limit=API_CONNECTION_LIMIT,
+                 keepalive_timeout=API_KEEPALIVE_TIMEOUT, timeout=API_TIMEOUT):
+        self.base_url = base_url
+        self.token = token
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session = None
+        self.mentors_cache = AsyncTTLCache(MENTORS_CACHE_TTL, MENTORS_CACHE_STALE)
+        self.breaker = CircuitBreaker()
+
+    @property
+    def available(self):
+        """Можно ли сейчас обращаться к API (автомат защиты не разомкнут)."""
+        return self.breaker.allows_request()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'Authorization': f'Token {self.token}'},
+            )
+        return self._session
+
+    async def startup(self):
+        self._get_session()
+        logger.info("Клиент API сотрудников запущен: %s", self.base_url)
+
+    async def shutdown(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        logger.info("Клиент API сотрудников остановлен")
+
+    async def _request(self, method, timeout, **kwargs):
+        """
+        Запрос к API с таймаутом, ограниченными повторами с разбросом задержки
+        и учётом в автомате защиты. Ответы 4xx не повторяются и не считаются
+        отказом API.
+        """
+        for attempt in range(API_RETRIES + 1):
+            probe = self.breaker.before_request()
+            try:
+                async with self._get_session().request(
+                    method, self.base_url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                ) as resp:
+                    resp.raise_for_status()
+                    result = await resp.json()
+            except Exception as e:
+                retryable = _is_retryable(e)
+                self.breaker.record(not retryable, probe)
+                if not retryable or attempt == API_RETRIES:
+                    raise
+                delay = random.uniform(0, API_RETRY_BASE * 2 ** attempt)
+                logger.warning("Запрос %s к API не удался (%s), повтор через %.2f с", method, e, delay)
+                await asyncio.sleep(delay)
+                continue
+            else:
+                self.breaker.record(True, probe)
+                return result
+            finally:
+                # Отмена (CancelledError) не попадает в except Exception: без
+                # этого автомат навсегда остался бы с занятым пробным запросом
+                self.breaker.release(probe)
+
+    async def upsert_employee(self, data: dict) -> dict:
+        result = await self._request('POST', API_UPSERT_TIMEOUT, json=data)
+        self.mentors_cache.invalidate(lambda key, mentors: _is_mentor_update(key, mentors, data))
+        return result
+
+    async def fetch_mentors(self, city: str, role: str = "mentor") -> list:
+        """Запрашивает список сотрудников с заданным городом и ролью, минуя кэш."""
+        params = {'city': city, 'role': role}
+        return await self._request('GET', API_MENTORS_TIMEOUT, params=params)
+
+    async def get_mentors(self, city: str, role: str = "mentor") -> list:
+        """
+        Возвращает список сотрудников с заданным городом и ролью (через кэш).
+        """
+        mentors = await self.mentors_cache.get((city, role), lambda: self.fetch_mentors(city, role))
+        return list(mentors)
+
+
+api_client = EmployeeApiClient()
+
+
 async def upsert_employee(data: dict) -> dict:
-    headers = {
-        'Authorization': f'Token {API_TOKEN}',
-        'Content-Type': 'application/json',
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(API_URL, json=data, headers=headers) as resp:
-            resp.raise_for_status()
-            return await resp.json()
+    return await api_client.upsert_employee(data)
 
 async def get_mentors(city: str, role: str = "mentor") -> list:
     """
     Возвращает список сотрудников с заданным городом и ролью.
     """
-    params = {'city': city, 'role': role}
-    headers = {
-        'Authorization': f'Token {API_TOKEN}',
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(API_URL, params=params, headers=headers) as resp:
-            resp.raise_for_status()
-            return await resp.json()
\ No newline at end of file
+    return await api_client.get_mentors(city, role)
@@ -0,0 +1,216 @@
+import os
+import time
+import logging
+import sqlite3
+import threading
+from config import ATTESTATION_DB_FILE, SESSION_TTL
+from utils.json_utils import load_from_json_async, _run_io
+
+# Сессии итоговой аттестации. Вопросы аттестации — это mistakes из профиля
+# стажёра; в базе на каждого стажёра хранится только номер текущего вопроса
+# и битовая маска ошибок (шестнадцатеричной строкой: вопросов может быть
+# больше, чем бит в INTEGER SQLite). Горячая копия сессии держится в памяти, так что
+# ответ на вопрос не перечитывает профиль, а правильные ответы не покидают
+# сервер. После перезапуска сессия восстанавливается из базы при первом
+# обращении, а вопросы — из профиля. Строки брошенных аттестаций (без
+# ответов дольше SESSION_TTL) удаляются при старте и при выселении сессий.
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attestations (
+    user_id TEXT PRIMARY KEY,
+    question_index INTEGER NOT NULL,
+    errors TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    updated_at REAL NOT NULL DEFAULT 0
+)
+"""
+# Базы, созданные до появления updated_at: существующие строки получают
+# полный TTL с момента миграции
+ADD_UPDATED_AT = "ALTER TABLE attestations ADD COLUMN updated_at REAL NOT NULL DEFAULT 0"
+INIT_UPDATED_AT = "UPDATE attestations SET updated_at = ? WHERE updated_at = 0"
+# Базы, где маска хранилась в INTEGER (переполнение с 64-го вопроса):
+# таблица пересоздаётся, маска переводится в шестнадцатеричную строку
+RENAME_OLD = "ALTER TABLE attestations RENAME TO attestations_old"
+COPY_OLD = (
+    "INSERT INTO attestations (user_id, question_index, errors, total, updated_at) "
+    "SELECT user_id, question_index, printf('%x', errors), total, updated_at FROM attestations_old"
+)
+DROP_OLD = "DROP TABLE attestations_old"
+CREATE_UPDATED_INDEX = "CREATE INDEX IF NOT EXISTS attestations_updated ON attestations (updated_at)"
+SELECT_SESSION = "SELECT question_index, errors, total FROM attestations WHERE user_id = ?"
+UPSERT_SESSION = """
+INSERT INTO attestations (user_id, question_index, errors, total, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    question_index = excluded.question_index,
+    errors = excluded.errors,
+    total = excluded.total,
+    updated_at = excluded.updated_at
+"""
+DELETE_SESSION = "DELETE FROM attestations WHERE user_id = ?"
+DELETE_EXPIRED = "DELETE FROM attestations WHERE updated_at < ?"
+
+_connection = None
+_lock = threading.Lock()
+_sessions = {}
+
+
+class AttestationSession:
+    """Прогресс стажёра: вопросы, номер текущего вопроса и маска ошибок."""
+
+    __slots__ = ("user_id", "questions", "index", "errors")
+
+    def __init__(self, user_id, questions, index=0, errors=0):
+        self.user_id = user_id
+        self.questions = questions
+        self.index = index
+        self.errors = errors
+
+    @property
+    def finished(self):
+        return self.index >= len(self.questions)
+
+    @property
+    def current_question(self):
+        return None if self.finished else self.questions[self.index]
+
+    @property
+    def error_count(self):
+        return bin(self.errors).count("1")
+
+    def error_questions(self):
+        """Вопросы, на которые дан неверный ответ, в порядке прохождения."""
+        return [question for i, question in enumerate(self.questions) if self.errors >> i & 1]
+
+
+def _connect():
+    global _connection
+    if _connection is None:
+        directory = os.path.dirname(ATTESTATION_DB_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(ATTESTATION_DB_FILE, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(SCHEMA)
+        columns = {row[1]: row[2] for row in connection.execute("PRAGMA table_info(attestations)")}
+        if "updated_at" not in columns:
+            with connection:
+                connection.execute(ADD_UPDATED_AT)
+                connection.execute(INIT_UPDATED_AT, (time.time(),))
+        if columns["errors"].upper() != "TEXT":
+            with connection:
+                connection.execute(RENAME_OLD)
+                connection.execute(SCHEMA)
+                connection.execute(COPY_OLD)
+                connection.execute(DROP_OLD)
+        connection.execute(CREATE_UPDATED_INDEX)
+        _connection = connection
+    return _connection
+
+
+def _execute(query, params):
+    with _lock:
+        connection = _connect()
+        with connection:
+            return connection.execute(query, params).fetchone()
+
+
+def _delete_expired(ttl):
+    with _lock:
+        connection = _connect()
+        with connection:
+            return connection.execute(DELETE_EXPIRED, (time.time() - ttl,)).rowcount
+
+
+async def _run(query, params):
+    return await _run_io(_execute, query, params)
+
+
+def _key(user_id):
+    return str(user_id)
+
+
+async def _store(session):
+    await _run(
+        UPSERT_SESSION,
+        (_key(session.user_id), session.index, format(session.errors, "x"), len(session.questions), time.time())
+    )
+
+
+def _correct_answer(question):
+    try:
+        return int(question.get("correct_answer", 1))
+    except (TypeError, ValueError):
+        return None
+
+
+async def start(user_id, questions):
+    """Начинает аттестацию заново с первого вопроса."""
+    session = AttestationSession(user_id, list(questions))
+    _sessions[_key(user_id)] = session
+    await _store(session)
+    logger.info("Аттестация стажёра %s начата: %s вопросов", user_id, len(session.questions))
+    return session
+
+
+async def get(user_id):
+    """Активная сессия или None. После перезапуска восстанавливается из базы."""
+    session = _sessions.get(_key(user_id))
+    if session is not None:
+        return session
+    row = await _run(SELECT_SESSION, (_key(user_id),))
+    if row is None:
+        return None
+    index, errors, total = row
+    trainee_data = await load_from_json_async(user_id) or {}
+    questions = trainee_data.get("mistakes", [])
+    if len(questions) != total:
+        # Список вопросов изменился — прогресс к нему уже не относится
+        logger.warning("Аттестация стажёра %s не восстановлена: изменился список вопросов", user_id)
+        await _run(DELETE_SESSION, (_key(user_id),))
+        return None
+    session = AttestationSession(user_id, questions, index, int(errors, 16))
+    _sessions[_key(user_id)] = session
+    logger.info("Аттестация стажёра %s восстановлена на вопросе %s", user_id, index + 1)
+    return session
+
+
+async def answer(user_id, question_index, selected_answer):
+    """
+    Засчитывает ответ на вопрос question_index. Повторное нажатие на кнопку
+    уже пройденного вопроса игнорируется. Возвращает сессию или None.
+    """
+    session = await get(user_id)
+    if session is None or session.finished or question_index != session.index:
+        return session
+    if selected_answer != _correct_answer(session.current_question):
+        session.errors |= 1 << session.index
+    session.index += 1
+    await _store(session)
+    return session
+
+
+async def finish(user_id):
+    """Завершает аттестацию и возвращает итоговую сессию (или None)."""
+    session = await get(user_id)
+    _sessions.pop(_key(user_id), None)
+    await _run(DELETE_SESSION, (_key(user_id),))
+    return session
+
+
+async def purge_expired(ttl=SESSION_TTL):
+    """Удаляет из базы аттестации без ответов дольше ttl секунд."""
+    deleted = await _run_io(_delete_expired, ttl)
+    if deleted:
+        logger.info("Удалено брошенных аттестаций: %s", deleted)
+    return deleted
+
+
+async def unload(user_id):
+    """
+    Выгружает горячую копию из памяти (вызывается при выселении сессии).
+    Прогресс остаётся в базе, пока ему не исполнится SESSION_TTL.
+    """
+    _sessions.pop(_key(user_id), None)
+    await purge_expired()
@@ -1,7 +1,7 @@
 import os
 import logging
-from aiogram.types import FSInputFile
 from bot_instance import bot
+from utils.media_cache import send_cached_media
 
 # Настройка логирования: вывод логов только в консоль
 logging.basicConfig(
@@ -16,8 +16,7 @@ async def send_message_or_photo(chat_id, text, image=None, keyboard=None):
         image_path = f"images/{image}"
         if os.path.exists(image_path):
             logger.info(f"Отправка изображения '{image_path}' пользователю {chat_id}")
-            photo = FSInputFile(image_path)
-            await bot.send_photo(chat_id, photo=photo, caption=text, reply_markup=keyboard)
+            await send_cached_media(bot.send_photo, "photo", image_path, chat_id=chat_id, caption=text, reply_markup=keyboard)
         else:
             logger.warning(f"Изображение не найдено: {image_path} для пользователя {chat_id}")
             await bot.send_message(chat_id, f"{text}\n⚠️ Изображение не найдено: {image_path}", reply_markup=keyboard)
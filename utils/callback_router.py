@@ -0,0 +1,146 @@
+import logging
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, User
+
+# Маршрутизация нажатий inline-кнопок. Раньше каждый обработчик проверял
+# callback_data своей lambda (c.data.startswith(...)), и нажатие проходило
+# по цепочке таких проверок во всех роутерах. Здесь обработчики
+# регистрируются по фабрике CallbackData (handlers.callback_data): префикс
+# нажатия выделяется один раз и обработчик находится по словарю, так что
+# стоимость не растёт с числом меню. Разобранные данные передаются
+# обработчику аргументом callback_data.
+logger = logging.getLogger(__name__)
+
+# Значения полей для пробных callback_data при проверке маршрутов
+SAMPLE_VALUES = {int: 0, str: "x", float: 0.0, bool: False}
+
+
+class CallbackRouter:
+    """Словарь (разделитель, префикс) → (фабрика CallbackData, обработчик)."""
+
+    def __init__(self, name="callbacks"):
+        self.router = Router(name=name)
+        self.router.callback_query.register(self._dispatch, self._resolve)
+        self._routes = {}
+        self._separators = []
+        self.duplicates = []
+
+    def handler(self, factory):
+        """Декоратор: обработчик нажатий кнопок с данными фабрики factory."""
+        def decorator(callback):
+            key = (factory.__separator__, factory.__prefix__)
+            registered = self._routes.get(key)
+            if registered is not None:
+                # Как и в aiogram, срабатывает зарегистрированный первым
+                self.duplicates.append((factory, registered[1].callback, callback))
+                return callback
+            self._routes[key] = (factory, CallableObject(callback))
+            if factory.__separator__ not in self._separators:
+                self._separators.append(factory.__separator__)
+            return callback
+        return decorator
+
+    def routes(self):
+        """Зарегистрированные маршруты: список пар (фабрика CallbackData, обработчик)."""
+        return list(self._routes.values())
+
+    def route(self, data):
+        """Маршрут (фабрика, обработчик) для строки callback_data или None."""
+        for sep in self._separators:
+            route = self._routes.get((sep, data.split(sep, 1)[0]))
+            if route is not None:
+                return route
+        return None
+
+    def _resolve(self, callback: CallbackQuery):
+        if not callback.data:
+            return False
+        route = self.route(callback.data)
+        if route is None:
+            return False
+        try:
+            callback_data = route[0].unpack(callback.data)
+        except (TypeError, ValueError) as e:
+            logger.warning("Некорректные данные кнопки %r: %s", callback.data, e)
+            return False
+        return {"callback_data": callback_data, "callback_route": route}
+
+    async def _dispatch(self, callback: CallbackQuery, callback_route, **kwargs):
+        return await callback_route[1].call(callback, **kwargs)
+
+    def samples(self):
+        """Пробные callback_data для каждой зарегистрированной фабрики."""
+        result = {}
+        for factory, handler in self.routes():
+            try:
+                values = {name: SAMPLE_VALUES[field.annotation] for name, field in factory.model_fields.items()}
+                result[factory(**values).pack()] = (factory, handler)
+            except (KeyError, ValueError) as e:
+                logger.warning("Не удалось построить пробные данные для %s: %s", factory.__name__, e)
+        return result
+
+
+callbacks = CallbackRouter()
+
+
+def _name(callback):
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+def _factories(base=CallbackData):
+    """Все фабрики-наследники base, включая непрямых."""
+    for factory in base.__subclasses__():
+        yield factory
+        yield from _factories(factory)
+
+
+async def check_callback_routing(dispatcher):
+    """
+    Проверка при старте: повторные регистрации одной фабрики, фабрики
+    без обработчика или чьи данные уходят другому маршруту, и обработчики
+    нажатий в роутерах, которые перехватывают данные фабрик раньше
+    маршрутизатора или не срабатывают никогда. Возвращает список проблем.
+    """
+    problems = []
+    for factory, first, duplicate in callbacks.duplicates:
+        problems.append(f"{factory.__name__}: {_name(duplicate)} не сработает, уже есть {_name(first)}")
+    registered = {factory for factory, _ in callbacks.routes()}
+    for factory in dict.fromkeys(_factories()):
+        if factory not in registered:
+            problems.append(f"У кнопок {factory.__name__} ({factory.__prefix__!r}) нет обработчика")
+
+    handlers = [
+        handler for router in dispatcher.chain_tail
+        for handler in router.callback_query.handlers
+    ]
+    samples = callbacks.samples()
+    for data, (factory, route_handler) in samples.items():
+        route = callbacks.route(data)
+        if route is None or route[0] is not factory:
+            problems.append(f"Данные {data!r} фабрики {factory.__name__} уходят в {route[0].__name__ if route else 'никуда'}")
+            continue
+        event = CallbackQuery(id="0", chat_instance="0", data=data, from_user=User(id=0, is_bot=False, first_name="check"))
+        matched = []
+        for handler in handlers:
+            try:
+                passed, _ = await handler.check(event)
+            except Exception:
+                # Фильтры, которым нужен контекст апдейта (FSM и т.п.), не проверить
+                continue
+            if passed:
+                matched.append(handler.callback)
+        if not matched:
+            problems.append(f"{factory.__name__}: маршрутизатор кнопок не подключён к диспетчеру")
+            continue
+        if getattr(matched[0], "__self__", None) is not callbacks:
+            problems.append(f"{factory.__name__} ({_name(route_handler.callback)}) перекрыт обработчиком {_name(matched[0])}")
+        for callback in matched[1:]:
+            if getattr(callback, "__self__", None) is not callbacks:
+                problems.append(f"Обработчик {_name(callback)} не сработает для {data!r}: данные уже обработаны")
+
+    for problem in problems:
+        logger.warning("Маршрутизация кнопок: %s", problem)
+    logger.info("Маршрутов кнопок: %s, проблем: %s", len(samples), len(problems))
+    return problems
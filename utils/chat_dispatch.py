@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from aiogram import BaseMiddleware
+from config import UPDATE_CONCURRENCY, CHAT_QUEUE_DEPTH
+
+# Порядок обработки апдейтов. aiogram запускает каждый апдейт отдельной
+# задачей, поэтому быстрые нажатия одного пользователя (next_, answer_)
+# могли обрабатываться одновременно и вперемешку. Middleware выстраивает
+# апдейты одного чата в очередь (asyncio.Lock отдаёт блокировку в порядке
+# ожидания), разные чаты обрабатываются параллельно, но не больше
+# UPDATE_CONCURRENCY одновременно. Если в очереди чата уже CHAT_QUEUE_DEPTH
+# апдейтов, новые отбрасываются (на нажатие кнопки отвечаем подсказкой).
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "Подождите, предыдущее действие ещё выполняется"
+
+
+class _ChatQueue:
+    __slots__ = ("lock", "size")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.size = 0
+
+
+class ChatSequentialMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: по очереди внутри чата, параллельно между чатами."""
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, queue_depth=CHAT_QUEUE_DEPTH):
+        self.queue_depth = queue_depth
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues = {}
+        self.dropped = 0
+
+    @staticmethod
+    def _chat_key(event, data):
+        # Inline-запросы только читают данные, Telegram сам отменяет устаревшие
+        if event.inline_query is not None:
+            return None
+        chat = data.get("event_chat")
+        if chat is not None:
+            return chat.id
+        user = data.get("event_from_user")
+        return user.id if user is not None else None
+
+    async def _drop(self, event, key):
+        self.dropped += 1
+        logger.warning("Очередь чата %s переполнена (%s), апдейт %s отброшен", key, self.queue_depth, event.update_id)
+        if event.callback_query is not None:
+            try:
+                await event.callback_query.answer(BUSY_TEXT)
+            except Exception as e:
+                logger.error("Не удалось ответить на нажатие в чате %s: %s", key, e)
+
+    async def __call__(self, handler, event, data):
+        key = self._chat_key(event, data)
+        if key is None:
+            async with self._semaphore:
+                return await handler(event, data)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ChatQueue()
+        if queue.size >= self.queue_depth:
+            return await self._drop(event, key)
+        queue.size += 1
+        try:
+            # Сначала очередь чата, потом общий лимит: ожидающие своей
+            # очереди апдейты не занимают места в общем лимите
+            async with queue.lock:
+                async with self._semaphore:
+                    return await handler(event, data)
+        finally:
+            queue.size -= 1
+            if not queue.size:
+                del self._queues[key]
@@ -0,0 +1,40 @@
+import os
+import logging
+from utils.employee_outbox import employee_outbox
+
+# Отложенная запись изменений профиля в API сотрудников. Регистрация меняет
+# профиль почти на каждом шаге; каждое частичное изменение сразу сохраняется
+# в очередь отправки utils.employee_outbox (переживает падение бота), но
+# придерживается там на EMPLOYEE_FLUSH_DELAY секунд после последнего
+# изменения пользователя. Очередь объединяет записи одного пользователя в
+# один запрос. В точках фиксации (конец регистрации) придержанное уходит сразу.
+EMPLOYEE_FLUSH_DELAY = float(os.getenv('EMPLOYEE_FLUSH_DELAY', '3'))
+
+logger = logging.getLogger(__name__)
+
+
+class EmployeeWriteBuffer:
+    """Отложенная отправка частичных изменений профилей через очередь, ключ — telegram_id."""
+
+    def __init__(self, outbox=employee_outbox, delay=EMPLOYEE_FLUSH_DELAY):
+        self.outbox = outbox
+        self.delay = delay
+
+    async def update(self, data: dict):
+        """Сохраняет изменения в очередь; более поздние значения полей заменят ранние при отправке."""
+        await self.outbox.enqueue(data, delay=self.delay)
+
+    async def flush(self, telegram_id):
+        """Отправляет накопленные изменения пользователя без ожидания."""
+        await self.outbox.release(telegram_id)
+        logger.info("Изменения профиля %s переданы на отправку", telegram_id)
+
+
+employee_buffer = EmployeeWriteBuffer()
+
+
+async def queue_employee_update(data: dict):
+    await employee_buffer.update(data)
+
+async def flush_employee_updates(telegram_id):
+    await employee_buffer.flush(telegram_id)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import sqlite3
+import threading
+import aiohttp
+from config import (
+    OUTBOX_DB_FILE, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL,
+    OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX, OUTBOX_MAX_ATTEMPTS
+)
+from utils.api_client import api_client, upsert_employee, CircuitOpenError
+
+# Очередь исходящих изменений профилей (outbox). Обработчик только дописывает
+# строку в SQLite и сразу возвращается; фоновая задача отправляет записи
+# в API сотрудников. Записи одного пользователя объединяются в один запрос
+# и уходят строго по порядку; при ошибке пользователь откладывается с
+# экспоненциальной задержкой и разбросом. Очередь переживает перезапуск бота.
+# Запись можно придержать (delay в enqueue): пользователь не отправляется,
+# пока не готова его самая свежая запись, поэтому частые изменения одного
+# профиля уходят одним запросом, но с первой же секунды лежат на диске.
+# Записи, которые API отверг (4xx) или которые исчерпали OUTBOX_MAX_ATTEMPTS,
+# помечаются failed и остаются в базе для разбора. Пока автомат защиты
+# API разомкнут, очередь не расходует попытки и ждёт.
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    telegram_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (failed, telegram_id, id);
+"""
+INSERT = "INSERT INTO outbox (telegram_id, data, next_attempt, created_at) VALUES (?, ?, ?, ?)"
+# Снимает придержание с ещё не отправлявшихся записей пользователя
+RELEASE_USER = "UPDATE outbox SET next_attempt = 0 WHERE failed = 0 AND attempts = 0 AND telegram_id = ?"
+# Пользователи, чья самая старая запись готова к отправке
+SELECT_READY_USERS = """
+SELECT telegram_id, MIN(id) AS first_id, MAX(next_attempt) AS next_attempt
+FROM outbox WHERE failed = 0
+GROUP BY telegram_id HAVING MAX(next_attempt) <= ?
+ORDER BY first_id LIMIT ?
+"""
+SELECT_USER_ROWS = "SELECT id, data, attempts FROM outbox WHERE failed = 0 AND telegram_id = ? ORDER BY id"
+SELECT_NEXT_ATTEMPT = "SELECT MIN(next_attempt) FROM (SELECT MAX(next_attempt) AS next_attempt FROM outbox WHERE failed = 0 GROUP BY telegram_id)"
+SELECT_PENDING_COUNT = "SELECT COUNT(*) FROM outbox WHERE failed = 0"
+DELETE_ROW = "DELETE FROM outbox WHERE id = ?"
+RESCHEDULE_ROW = "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?"
+FAIL_ROW = "UPDATE outbox SET failed = 1, attempts = ? WHERE id = ?"
+
+
+def _is_permanent(error):
+    # Ответ 4xx (кроме 408 и 429) не исправится повтором того же запроса
+    return (
+        isinstance(error, aiohttp.ClientResponseError)
+        and 400 <= error.status < 500 and error.status not in (408, 429)
+    )
+
+
+class EmployeeOutbox:
+    """Надёжная очередь записей в API сотрудников с фоновой отправкой."""
+
+    def __init__(self, path=OUTBOX_DB_FILE, send=upsert_employee, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL, retry_base=OUTBOX_RETRY_BASE,
+                 retry_max=OUTBOX_RETRY_MAX, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 available=lambda: api_client.available):
+        self.path = path
+        self.send = send
+        self.available = available
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self._connection = None
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._task = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _query(self, query, params=()):
+        with self._lock:
+            return self._connect().execute(query, params).fetchall()
+
+    def _write(self, statements):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for query, params in statements:
+                    connection.execute(query, params)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def enqueue(self, data: dict, delay=0):
+        """Сохраняет изменения профиля в очередь; отправка — в фоне, не раньше чем через delay секунд."""
+        payload = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        await self._run(self._write, [(INSERT, (str(data['telegram_id']), payload, now + delay if delay else 0, now))])
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def release(self, telegram_id):
+        """Отправляет придержанные изменения пользователя без ожидания."""
+        await self._run(self._write, [(RELEASE_USER, (str(telegram_id),))])
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending_count(self):
+        return self._query(SELECT_PENDING_COUNT)[0][0]
+
+    def _backoff(self, attempts):
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return random.uniform(delay / 2, delay)
+
+    async def _send_user(self, telegram_id):
+        rows = await self._run(self._query, SELECT_USER_ROWS, (telegram_id,))
+        if not rows:
+            return
+        payload = {}
+        for _, data, _ in rows:
+            payload.update(json.loads(data))
+        ids = [row[0] for row in rows]
+        attempts = max(row[2] for row in rows) + 1
+        try:
+            await self.send(payload)
+        except CircuitOpenError as e:
+            # API недоступен — попытку не засчитываем
+            logger.info("Изменения профиля %s ждут восстановления API: %s", telegram_id, e)
+            return
+        except Exception as e:
+            if _is_permanent(e) or attempts >= self.max_attempts:
+                await self._run(self._write, [(FAIL_ROW, (attempts, row_id)) for row_id in ids])
+                logger.error("Изменения профиля %s не приняты API и отложены как failed: %s", telegram_id, e)
+            else:
+                next_attempt = time.time() + self._backoff(attempts)
+                await self._run(self._write, [(RESCHEDULE_ROW, (attempts, next_attempt, row_id)) for row_id in ids])
+                logger.warning("Изменения профиля %s не отправлены (попытка %s): %s", telegram_id, attempts, e)
+            return
+        await self._run(self._write, [(DELETE_ROW, (row_id,)) for row_id in ids])
+        logger.info("Изменения профиля %s отправлены в API (записей: %s)", telegram_id, len(ids))
+
+    async def drain_once(self):
+        """Отправляет одну пачку готовых записей; возвращает число обработанных пользователей."""
+        if not self.available():
+            return 0
+        users = await self._run(self._query, SELECT_READY_USERS, (time.time(), self.batch_size))
+        await asyncio.gather(*(self._send_user(telegram_id) for telegram_id, _, _ in users))
+        return len(users)
+
+    async def _seconds_until_next(self):
+        next_attempt = (await self._run(self._query, SELECT_NEXT_ATTEMPT))[0][0]
+        if next_attempt is None:
+            return self.poll_interval
+        return min(max(next_attempt - time.time(), 0), self.poll_interval)
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.drain_once():
+                    continue
+                if self.available():
+                    delay = await self._seconds_until_next()
+                else:
+                    delay = self.poll_interval
+            except Exception as e:
+                logger.error("Ошибка обработки очереди изменений профилей: %s", e)
+                delay = self.poll_interval
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+            logger.info("Очередь изменений профилей запущена, в очереди: %s", await self._run(self.pending_count))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        logger.info("Очередь изменений профилей остановлена, не отправлено: %s", await self._run(self.pending_count))
+
+
+employee_outbox = EmployeeOutbox()
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import logging
+import threading
+from datetime import datetime
+from config import FEEDBACK_FILE, FEEDBACK_LOG_FILE
+
+# Журнал отзывов: одна JSON-строка на отзыв, только дозапись в конец файла.
+# Сохранение отзыва не зависит от числа уже полученных отзывов, а параллельные
+# отправки не теряют данные. Вложенный формат feedback.json
+# ({user_id: {first_name, last_name, feedbacks: [...]}}) собирается по запросу.
+#
+# Выгрузка и сжатие журнала:
+#   python -m utils.feedback_log export <файл>  — записать вложенный формат в файл
+#   python -m utils.feedback_log compact        — перенести журнал в feedback.json
+#
+# Перед сжатием журнал переименовывается в FEEDBACK_PENDING_FILE: отзывы,
+# пришедшие во время сжатия, пишутся уже в новый журнал и не теряются.
+logger = logging.getLogger(__name__)
+
+# Журнал, который сейчас переносится в feedback.json
+FEEDBACK_PENDING_FILE = FEEDBACK_LOG_FILE + ".compacting"
+
+_lock = threading.Lock()
+
+
+def append_feedback(user_id, feedback_text, first_name, last_name):
+    """Дописывает отзыв в журнал одной записью."""
+    entry = {
+        "user_id": str(user_id),
+        "first_name": first_name,
+        "last_name": last_name,
+        "text": feedback_text,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    directory = os.path.dirname(FEEDBACK_LOG_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _lock:
+        fd = os.open(FEEDBACK_LOG_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _iter_file(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Пропущена повреждённая строка %s в %s", number, path)
+
+
+def iter_feedback():
+    """Перебирает записи журнала (включая переносимый), пропуская повреждённые строки."""
+    yield from _iter_file(FEEDBACK_PENDING_FILE)
+    yield from _iter_file(FEEDBACK_LOG_FILE)
+
+
+def _load_base():
+    if not os.path.exists(FEEDBACK_FILE) or os.stat(FEEDBACK_FILE).st_size == 0:
+        return {}
+    try:
+        with open(FEEDBACK_FILE, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except json.JSONDecodeError as e:
+        logger.error("Ошибка декодирования JSON в файле отзывов %s: %s", FEEDBACK_FILE, e)
+        return {}
+
+
+def build_feedback(entries=None):
+    """Собирает отзывы во вложенном формате: feedback.json плюс записи журнала (или entries)."""
+    feedback_data = _load_base()
+    for entry in iter_feedback() if entries is None else entries:
+        user_id = entry.get("user_id")
+        user_feedback = feedback_data.get(user_id)
+        if user_feedback is None:
+            feedback_data[user_id] = {
+                "first_name": entry.get("first_name"),
+                "last_name": entry.get("last_name"),
+                "feedbacks": [entry.get("text")],
+            }
+        else:
+            user_feedback.setdefault("feedbacks", []).append(entry.get("text"))
+    return feedback_data
+
+
+def export_feedback(path):
+    """Записывает отзывы во вложенном формате в path."""
+    from utils.json_utils import atomic_write_json
+
+    if os.path.abspath(path) == os.path.abspath(FEEDBACK_FILE):
+        raise ValueError("Для записи в feedback.json используйте compact_feedback()")
+    with _lock:
+        feedback_data = build_feedback()
+        atomic_write_json(path, feedback_data)
+    logger.info("Отзывы выгружены в %s", path)
+    return feedback_data
+
+
+def compact_feedback():
+    """Переносит журнал в feedback.json; новые отзывы пишутся в новый журнал."""
+    from utils.json_utils import atomic_write_json
+
+    with _lock:
+        if os.path.exists(FEEDBACK_PENDING_FILE):
+            # Прошлое сжатие прервано: сначала переносим его журнал,
+            # текущий останется до следующего запуска
+            logger.warning("Найден незавершённый перенос %s, журнал %s будет перенесён позже",
+                           FEEDBACK_PENDING_FILE, FEEDBACK_LOG_FILE)
+        elif os.path.exists(FEEDBACK_LOG_FILE):
+            os.replace(FEEDBACK_LOG_FILE, FEEDBACK_PENDING_FILE)
+        feedback_data = build_feedback(_iter_file(FEEDBACK_PENDING_FILE))
+        atomic_write_json(FEEDBACK_FILE, feedback_data)
+        if os.path.exists(FEEDBACK_PENDING_FILE):
+            os.remove(FEEDBACK_PENDING_FILE)
+    logger.info("Журнал отзывов перенесён в %s", FEEDBACK_FILE)
+    return feedback_data
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "export" and len(sys.argv) > 2:
+        export_feedback(sys.argv[2])
+    elif command == "compact":
+        compact_feedback()
+    else:
+        print("Использование: python -m utils.feedback_log export <файл> | compact")
+        sys.exit(2)
@@ -0,0 +1,163 @@
+import os
+import json
+import asyncio
+import logging
+import sqlite3
+import dataclasses
+from typing import Any, Dict, Mapping, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from config import FSM_DB_FILE, FSM_FLUSH_INTERVAL
+
+# Постоянное хранилище FSM: незавершённые регистрации, тесты и ожидание
+# отзыва переживают перезапуск бота. Все ключи держатся в памяти, поэтому
+# state.get_data() не обращается к диску; изменения копятся и пачкой
+# записываются в SQLite раз в FSM_FLUSH_INTERVAL секунд и при остановке.
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL
+)
+"""
+SELECT_ALL = "SELECT key, state, data FROM fsm"
+UPSERT = """
+INSERT INTO fsm (key, state, data) VALUES (?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data
+"""
+DELETE = "DELETE FROM fsm WHERE key = ?"
+
+
+def _encode_key(key: StorageKey) -> str:
+    return json.dumps(dataclasses.astuple(key), ensure_ascii=False)
+
+
+def _decode_key(raw: str) -> StorageKey:
+    return StorageKey(*json.loads(raw))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище с кэшем в памяти и отложенной пакетной записью в SQLite."""
+
+    def __init__(self, path: str = FSM_DB_FILE, flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._states: Dict[StorageKey, Optional[str]] = {}
+        self._data: Dict[StorageKey, Dict[str, Any]] = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._load()
+
+    def _load(self):
+        count = 0
+        for raw_key, state, data in self._conn.execute(SELECT_ALL):
+            try:
+                key = _decode_key(raw_key)
+                self._data[key] = json.loads(data)
+            except Exception as e:
+                logger.error("Пропущена повреждённая запись FSM %s: %s", raw_key, e)
+                continue
+            if state is not None:
+                self._states[key] = state
+            count += 1
+        logger.info("Состояния FSM загружены из %s: %s записей", self.path, count)
+
+    def keys(self):
+        """Ключи, для которых сохранено состояние или данные."""
+        return set(self._states) | set(self._data)
+
+    def forget(self, key: StorageKey):
+        """Удаляет состояние и данные ключа; из базы запись уйдёт при ближайшей выгрузке."""
+        if key in self._states or key in self._data:
+            self._states.pop(key, None)
+            self._data.pop(key, None)
+            self._mark_dirty(key)
+
+    def _mark_dirty(self, key: StorageKey):
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Начатую запись не прерываем: close() дождётся её через _flush_lock
+        await asyncio.shield(self.flush())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        if state is None:
+            self._states.pop(key, None)
+        else:
+            self._states[key] = state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._states.get(key)
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if data:
+            self._data[key] = dict(data)
+        else:
+            self._data.pop(key, None)
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict(self._data.get(key, {}))
+
+    def _write(self, rows):
+        with self._conn:
+            for raw_key, state, data in rows:
+                if data is None:
+                    self._conn.execute(DELETE, (raw_key,))
+                else:
+                    self._conn.execute(UPSERT, (raw_key, state, data))
+
+    async def flush(self):
+        """Записывает накопленные изменения в базу одной транзакцией."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            rows = []
+            for key in dirty:
+                state = self._states.get(key)
+                data = self._data.get(key)
+                if state is None and not data:
+                    rows.append((_encode_key(key), None, None))
+                    continue
+                try:
+                    rows.append((_encode_key(key), state, json.dumps(data or {}, ensure_ascii=False)))
+                except (TypeError, ValueError) as e:
+                    logger.error("Данные FSM для %s не сериализуются в JSON и не сохранены: %s", key, e)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, rows)
+            except Exception as e:
+                # Не теряем изменения: вернём ключи в очередь и повторим
+                # выгрузку через flush_interval, даже если новых изменений не будет
+                self._dirty |= dirty
+                logger.error("Ошибка записи состояний FSM в %s: %s", self.path, e)
+                if not self._closing:
+                    if self._flush_task is not None and not self._flush_task.done():
+                        self._flush_task.cancel()
+                    self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+                return
+            logger.debug("Состояния FSM выгружены: %s записей", len(rows))
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        self._conn.close()
+        logger.info("Хранилище FSM закрыто")
@@ -1,6 +1,19 @@
 import os
+import copy
 import json
+import asyncio
 import logging
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import LOCATIONS_FILE, PROFILE_CACHE_SIZE, IO_THREADS, USER_STORAGE, USER_DB_FILE, FEEDBACK_LOG_FILE, USER_DATA_PATH
+from utils import sqlite_store, feedback_log
+from utils.sqlite_store import merge_fields
+from utils.user_index import user_index, mentor_id_of
+from utils.training_content import get_training_content
 
 # Настройка логирования (если ещё не настроено в основном модуле, то здесь будет использоваться базовая конфигурация)
 logger = logging.getLogger(__name__)
@@ -10,7 +23,126 @@ if not logger.hasHandlers():
         format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
     )
 
-DATA_FILE = "data/locations.json"
+DATA_FILE = LOCATIONS_FILE
+
+
+class ProfileCache:
+    """
+    Ограниченный LRU-кэш профилей пользователей.
+    Запись считается актуальной, пока у файла не изменились mtime и размер;
+    при сохранении профиль кладётся в кэш сразу (write-through).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self.invalidate(filename)
+            return None
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or entry[0] != (stat.st_mtime_ns, stat.st_size):
+                return None
+            self._entries.move_to_end(filename)
+            # Отдаём копию: обработчики меняют профиль до сохранения
+            return copy.deepcopy(entry[1])
+
+    def put(self, filename, data):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            self.invalidate(filename)
+            return
+        with self._lock:
+            self._entries[filename] = ((stat.st_mtime_ns, stat.st_size), copy.deepcopy(data))
+            self._entries.move_to_end(filename)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, filename):
+        with self._lock:
+            self._entries.pop(filename, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+profile_cache = ProfileCache(PROFILE_CACHE_SIZE)
+
+
+def _user_filename(user_id):
+    return f"data/users/user_{user_id}.json"
+
+
+def _use_sqlite():
+    return USER_STORAGE == "sqlite"
+
+
+def _read_profile(user_id):
+    """Читает профиль из кэша или с диска. Возвращает None, если файла нет."""
+    if _use_sqlite():
+        return sqlite_store.load_user(user_id)
+    filename = _user_filename(user_id)
+    data = profile_cache.get(filename)
+    if data is not None:
+        logger.debug("Данные пользователя %s взяты из кэша", user_id)
+        return data
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "r", encoding="utf-8") as file:
+        data = json.load(file)
+    profile_cache.put(filename, data)
+    logger.info("Данные пользователя %s успешно загружены из %s", user_id, filename)
+    return data
+
+
+def atomic_write_json(filename, data):
+    """
+    Записывает JSON во временный файл рядом с целевым, делает fsync и
+    атомарно подменяет им исходный файл. При сбое на диске остаётся
+    либо старая, либо новая версия, но не обрезанный документ.
+    """
+    directory = os.path.dirname(filename) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, filename)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _write_profile(user_id, data):
+    if _use_sqlite():
+        sqlite_store.save_user(user_id, data)
+        return USER_DB_FILE
+    filename = _user_filename(user_id)
+    try:
+        atomic_write_json(filename, data)
+    except Exception:
+        profile_cache.invalidate(filename)
+        raise
+    profile_cache.put(filename, data)
+    user_index.update(user_id, data)
+    return filename
 
 def load_locations():
     """Загружает локации из JSON-файла."""
@@ -24,99 +156,241 @@ def load_locations():
         return []
 
 def save_to_json(user_id, data):
-    filename = f"data/users/user_{user_id}.json"
     try:
-        with open(filename, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        filename = _write_profile(user_id, data)
         logger.info("Данные пользователя %s сохранены в %s", user_id, filename)
     except Exception as e:
         logger.error("Ошибка сохранения данных пользователя %s: %s", user_id, e)
 
 def load_from_json(user_id):
     """Загружает данные пользователя из JSON-файла."""
-    filename = f"data/users/user_{user_id}.json"
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            logger.info("Данные пользователя %s успешно загружены из %s", user_id, filename)
-            return data
-        except Exception as e:
-            logger.error("Ошибка загрузки данных пользователя %s: %s", user_id, e)
-            return None
-    logger.info("Файл пользователя %s не найден", user_id)
-    return None
-
-def load_training_data():
-    filename = "data/training_data.json"
-    if not os.path.exists(filename):
-        logger.warning("Файл обучающих материалов %s не найден", filename)
-        return {}
     try:
-        with open(filename, "r", encoding="utf-8") as file:
-            data = json.load(file)
-        logger.info("Обучающие данные успешно загружены из %s", filename)
-        return data
+        data = _read_profile(user_id)
     except Exception as e:
-        logger.error("Ошибка загрузки обучающих данных из %s: %s", filename, e)
-        return {}
+        logger.error("Ошибка загрузки данных пользователя %s: %s", user_id, e)
+        return None
+    if data is None:
+        logger.info("Файл пользователя %s не найден", user_id)
+    return data
+
+def load_training_data():
+    """Снимок обучающих материалов из реестра utils.training_content."""
+    return get_training_content()
 
 def load_user_data(user_id):
-    filename = f"data/users/user_{user_id}.json"
-    if os.path.exists(filename):
-        try:
-            with open(filename, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            logger.info("Данные пользователя %s успешно загружены из %s", user_id, filename)
-            return data
-        except Exception as e:
-            logger.error("Ошибка загрузки данных пользователя %s: %s", user_id, e)
-            return None
-    logger.info("Файл данных пользователя %s не найден", user_id)
-    return None
+    try:
+        data = _read_profile(user_id)
+    except Exception as e:
+        logger.error("Ошибка загрузки данных пользователя %s: %s", user_id, e)
+        return None
+    if data is None:
+        logger.info("Файл данных пользователя %s не найден", user_id)
+    return data
 
 def save_user_data(user_id, data):
-    filename = f"data/users/user_{user_id}.json"
     try:
-        with open(filename, "w", encoding="utf-8") as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+        filename = _write_profile(user_id, data)
         logger.info("Данные пользователя %s успешно сохранены в %s", user_id, filename)
     except Exception as e:
         logger.error("Ошибка сохранения данных пользователя %s: %s", user_id, e)
 
+def user_exists(user_id):
+    if _use_sqlite():
+        return sqlite_store.user_exists(user_id)
+    return os.path.exists(_user_filename(user_id))
+
+def update_user_data(user_id, fields=None, lessons=None, new_mistakes=None, mistake_updates=None):
+    """
+    Частичное обновление профиля пользователя.
+      fields          — {ключ: значение} верхнего уровня (None удаляет ключ);
+      lessons         — {(раздел, название урока): {поле: значение}} для course_plan;
+      new_mistakes    — записи, добавляемые в конец mistakes;
+      mistake_updates — {индекс: {поле: значение}} для существующих записей mistakes.
+    В SQLite меняются только затронутые строки, в JSON-хранилище профиль
+    перезаписывается один раз. Возвращает False, если профиль не найден.
+    """
+    try:
+        if _use_sqlite():
+            updated = sqlite_store.update_user(user_id, fields, lessons, new_mistakes, mistake_updates)
+        else:
+            data = _read_profile(user_id)
+            if data is None:
+                updated = False
+            else:
+                merge_fields(data, fields or {})
+                for (section, title), changes in (lessons or {}).items():
+                    for lesson in data.get("course_plan", {}).get(section, []):
+                        if lesson.get("title") == title:
+                            merge_fields(lesson, changes)
+                            break
+                if new_mistakes:
+                    data.setdefault("mistakes", []).extend(new_mistakes)
+                mistakes = data.get("mistakes", [])
+                for index, changes in (mistake_updates or {}).items():
+                    if 0 <= index < len(mistakes):
+                        merge_fields(mistakes[index], changes)
+                _write_profile(user_id, data)
+                updated = True
+    except Exception as e:
+        logger.error("Ошибка обновления данных пользователя %s: %s", user_id, e)
+        return False
+    if updated:
+        logger.info("Данные пользователя %s частично обновлены", user_id)
+    else:
+        logger.info("Файл данных пользователя %s не найден", user_id)
+    return updated
+
+def find_user_ids(city, roles):
+    """Id пользователей из города city с одной из ролей roles (по вторичному индексу)."""
+    if _use_sqlite():
+        return sqlite_store.find_user_ids(city, roles)
+    return user_index.find(city, roles)
+
+def get_trainee_ids(mentor_id):
+    """Id стажёров наставника mentor_id."""
+    if _use_sqlite():
+        return sqlite_store.trainee_ids_of(mentor_id)
+    return user_index.trainees_of(mentor_id)
+
+def get_mentor_id(trainee_id):
+    """Id наставника стажёра trainee_id или None."""
+    if _use_sqlite():
+        return sqlite_store.mentor_id_of(trainee_id)
+    return user_index.mentor_of(trainee_id)
+
+def rebuild_user_index():
+    """Перестраивает индекс JSON-хранилища по файлам на диске."""
+    if not _use_sqlite():
+        user_index.rebuild()
+
+# Отметка о выполненном переносе карт "Trainee" в JSON-хранилище
+LEGACY_TRAINEES_MARKER = os.path.join(USER_DATA_PATH, ".trainee_links_migrated")
+
+def migrate_legacy_trainees():
+    """
+    Однократный перенос старых карт "Trainee" из профилей наставников
+    JSON-хранилища в поле mentor профилей стажёров (как в
+    sqlite_store._migrate_legacy_trainees). Стажёры без локального профиля
+    остаются в карте наставника и находятся через индекс. Перенос отмечается
+    файлом LEGACY_TRAINEES_MARKER. Вызывается при старте, до обработки
+    обновлений.
+    """
+    if _use_sqlite() or not os.path.isdir(USER_DATA_PATH) or os.path.exists(LEGACY_TRAINEES_MARKER):
+        return
+    linked = kept = 0
+    for name in sorted(os.listdir(USER_DATA_PATH)):
+        if not (name.startswith("user_") and name.endswith(".json")):
+            continue
+        mentor_id = name[len("user_"):-len(".json")]
+        try:
+            data = _read_profile(mentor_id)
+            if not data or "Trainee" not in data:
+                continue
+            remaining = {}
+            for trainee_id, trainee_info in (data["Trainee"] or {}).items():
+                trainee = _read_profile(trainee_id)
+                if trainee is None:
+                    remaining[trainee_id] = trainee_info
+                    continue
+                if mentor_id_of(trainee) is not None or trainee.get("role") == "Employee":
+                    continue
+                trainee["mentor"] = mentor_id
+                _write_profile(trainee_id, trainee)
+                linked += 1
+            # Профиль читается заново: наставник мог сам получить поле mentor выше
+            data = _read_profile(mentor_id)
+            merge_fields(data, {"Trainee": remaining or None})
+            _write_profile(mentor_id, data)
+            kept += len(remaining)
+        except Exception as e:
+            logger.error("Не удалось перенести связи стажёров наставника %s: %s", mentor_id, e)
+            return
+    with open(LEGACY_TRAINEES_MARKER, "w", encoding="utf-8") as file:
+        file.write("1\n")
+    logger.info(
+        'Связи стажёров из карт "Trainee" перенесены в поле mentor: %s, оставлены в картах (нет профиля): %s',
+        linked, kept,
+    )
+
 def load_feedback():
-    filename = "data/feedback/feedback.json"
-    if not os.path.exists(filename) or os.stat(filename).st_size == 0:
-        logger.info("Файл отзывов %s не найден или пустой", filename)
-        return {}
+    """Отзывы во вложенном формате feedback.json (с учётом журнала отзывов)."""
     try:
-        with open(filename, "r", encoding="utf-8") as file:
-            feedback = json.load(file)
-        logger.info("Отзывы успешно загружены из %s", filename)
+        feedback = feedback_log.build_feedback()
+        logger.info("Отзывы успешно загружены")
         return feedback
-    except json.JSONDecodeError as e:
-        logger.error("Ошибка декодирования JSON в файле отзывов %s: %s", filename, e)
+    except Exception as e:
+        logger.error("Ошибка загрузки отзывов: %s", e)
         return {}
 
 def save_feedback(user_id, feedback_text, first_name="Неизвестно", last_name="Неизвестно"):
-    filename = "data/feedback/feedback.json"
-    feedback_data = load_feedback()
-    
-    if str(user_id) in feedback_data:
-        user_feedback = feedback_data[str(user_id)]
-        if "feedbacks" not in user_feedback:
-            user_feedback["feedbacks"] = []
-        user_feedback["feedbacks"].append(feedback_text)
-    else:
-        feedback_data[str(user_id)] = {
-            "first_name": first_name,
-            "last_name": last_name,
-            "feedbacks": [feedback_text]
-        }
-    
     try:
-        with open(filename, "w", encoding="utf-8") as file:
-            json.dump(feedback_data, file, ensure_ascii=False, indent=4)
-        logger.info("Отзыв пользователя %s успешно сохранён в %s", user_id, filename)
+        feedback_log.append_feedback(user_id, feedback_text, first_name, last_name)
+        logger.info("Отзыв пользователя %s успешно сохранён в %s", user_id, FEEDBACK_LOG_FILE)
     except Exception as e:
         logger.error("Ошибка сохранения отзывов пользователя %s: %s", user_id, e)
+
+
+# Реестр блокировок по пользователям. Последовательности "загрузить — изменить —
+# сохранить" для одного пользователя выполняются под его блокировкой, для разных
+# пользователей — параллельно. Неиспользуемые блокировки удаляются сборщиком мусора.
+_user_locks = weakref.WeakValueDictionary()
+
+def user_lock(user_id):
+    """Возвращает asyncio.Lock для профиля пользователя user_id."""
+    key = str(user_id)
+    lock = _user_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[key] = lock
+    return lock
+
+
+# Асинхронные обёртки: чтение, запись и (де)сериализация JSON выполняются
+# в ограниченном пуле потоков, чтобы не блокировать цикл событий aiogram.
+_io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="json-io")
+
+async def _run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(func, *args, **kwargs))
+
+async def load_locations_async():
+    return await _run_io(load_locations)
+
+async def load_from_json_async(user_id):
+    return await _run_io(load_from_json, user_id)
+
+async def save_to_json_async(user_id, data):
+    await _run_io(save_to_json, user_id, data)
+
+async def load_user_data_async(user_id):
+    return await _run_io(load_user_data, user_id)
+
+async def save_user_data_async(user_id, data):
+    await _run_io(save_user_data, user_id, data)
+
+async def load_training_data_async():
+    return await _run_io(load_training_data)
+
+async def load_feedback_async():
+    return await _run_io(load_feedback)
+
+async def save_feedback_async(user_id, feedback_text, first_name="Неизвестно", last_name="Неизвестно"):
+    await _run_io(save_feedback, user_id, feedback_text, first_name, last_name)
+
+async def user_exists_async(user_id):
+    return await _run_io(user_exists, user_id)
+
+async def update_user_data_async(user_id, fields=None, lessons=None, new_mistakes=None, mistake_updates=None):
+    return await _run_io(update_user_data, user_id, fields, lessons, new_mistakes, mistake_updates)
+
+async def find_user_ids_async(city, roles):
+    return await _run_io(find_user_ids, city, tuple(roles))
+
+async def get_trainee_ids_async(mentor_id):
+    return await _run_io(get_trainee_ids, mentor_id)
+
+async def get_mentor_id_async(trainee_id):
+    return await _run_io(get_mentor_id, trainee_id)
+
+async def migrate_legacy_trainees_async():
+    await _run_io(migrate_legacy_trainees)
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import defaultdict
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+from config import LOCATIONS_FILE
+
+# Поисковый индекс по data/locations.json для inline-запросов.
+# Строится один раз и перестраивается только при изменении mtime файла.
+# Текст локации нормализуется (нижний регистр, ё → е, без знаков препинания),
+# слова длиной от трёх символов ищутся по триграммам, короткие — по префиксам
+# слов, так что запрос сводится к пересечению множеств. Ответ отдаётся
+# страницами: InlineQueryResultArticle собирается только для запрошенной
+# страницы и запоминается для следующих запросов.
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Нижний регистр, ё → е, знаки препинания заменены пробелами."""
+    return _NON_WORD.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def location_label(loc):
+    """Строка локации в формате "Название Город Адрес", которую вставляет inline-режим."""
+    return f"{loc['title']} {loc['city']} {loc['address']}"
+
+
+class LocationIndex:
+    """Неизменяемый индекс по списку локаций."""
+
+    def __init__(self, locations, mtime_ns=None):
+        self.mtime_ns = mtime_ns
+        self.locations = tuple(locations)
+        self.labels = frozenset(location_label(loc) for loc in self.locations)
+        self._results = [None] * len(self.locations)
+        self._texts = []
+        self._by_trigram = defaultdict(set)
+        self._by_prefix = defaultdict(set)
+        for i, loc in enumerate(self.locations):
+            text = " ".join(normalize(loc[key]) for key in ("title", "city", "address"))
+            self._texts.append(text)
+            for word in text.split():
+                for gram in _trigrams(word):
+                    self._by_trigram[gram].add(i)
+                for size in (1, 2):
+                    if len(word) >= size:
+                        self._by_prefix[word[:size]].add(i)
+        self._all = frozenset(range(len(self.locations)))
+
+    def search(self, query):
+        """Позиции локаций, в тексте которых встречается каждое слово запроса."""
+        words = normalize(query).split()
+        if not words:
+            return sorted(self._all)
+        candidates = None
+        for word in words:
+            if len(word) >= 3:
+                for gram in _trigrams(word):
+                    found = self._by_trigram.get(gram, set())
+                    candidates = set(found) if candidates is None else candidates & found
+            else:
+                found = self._by_prefix.get(word, set())
+                candidates = set(found) if candidates is None else candidates & found
+            if not candidates:
+                return []
+        # Триграммы дают надмножество: оставляем локации, где слово запроса
+        # действительно входит в текст
+        long_words = [word for word in words if len(word) >= 3]
+        return sorted(
+            i for i in candidates
+            if all(word in self._texts[i] for word in long_words)
+        )
+
+    def result(self, position):
+        """InlineQueryResultArticle для локации; собирается при первом обращении."""
+        article = self._results[position]
+        if article is None:
+            loc = self.locations[position]
+            article = InlineQueryResultArticle(
+                id=f"loc_{position}",
+                title=loc["title"],
+                description=f"{loc['city']}, {loc['address']}",
+                input_message_content=InputTextMessageContent(message_text=location_label(loc)),
+            )
+            self._results[position] = article
+        return article
+
+    def find_page(self, query, offset=0, limit=50):
+        """
+        Страница результатов для запроса: (список InlineQueryResultArticle,
+        next_offset). next_offset — пустая строка, если страница последняя.
+        """
+        positions = self.search(query)
+        page = positions[offset:offset + limit]
+        next_offset = str(offset + limit) if offset + limit < len(positions) else ""
+        return [self.result(i) for i in page], next_offset
+
+    def is_valid_label(self, text):
+        """Совпадает ли text со строкой одной из локаций."""
+        return text in self.labels
+
+
+_EMPTY = LocationIndex([])
+_index = _EMPTY
+_failed_mtime_ns = None
+_lock = threading.Lock()
+
+
+def get_location_index():
+    """Текущий индекс локаций; файл перечитывается только при изменении mtime."""
+    global _index, _failed_mtime_ns
+    try:
+        mtime_ns = os.stat(LOCATIONS_FILE).st_mtime_ns
+    except OSError:
+        if _index is not _EMPTY:
+            logger.warning("Файл локаций %s не найден", LOCATIONS_FILE)
+            _index = _EMPTY
+        return _index
+    if mtime_ns in (_index.mtime_ns, _failed_mtime_ns):
+        return _index
+    with _lock:
+        if mtime_ns not in (_index.mtime_ns, _failed_mtime_ns):
+            try:
+                with open(LOCATIONS_FILE, "r", encoding="utf-8") as file:
+                    locations = json.load(file)
+                _index = LocationIndex(locations, mtime_ns)
+                logger.info("Индекс локаций построен: %s локаций", len(locations))
+            except Exception as e:
+                _failed_mtime_ns = mtime_ns
+                logger.error("Ошибка загрузки базы локаций: %s", e)
+    return _index
@@ -0,0 +1,128 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+from config import MEDIA_CACHE_FILE
+from utils.json_utils import atomic_write_json
+
+# Реестр загруженных медиафайлов: путь → {sha256, mtime_ns, size, file_id}.
+# Файл отправляется с диска только один раз; дальше Telegram получает
+# file_id из реестра. Хэш содержимого пересчитывается, только если у файла
+# изменились mtime или размер; при новом содержимом file_id сбрасывается
+# и файл загружается заново. Реестр хранится в MEDIA_CACHE_FILE.
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_entries = None
+
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(MEDIA_CACHE_FILE, "r", encoding="utf-8") as file:
+                _entries = json.load(file)
+        except FileNotFoundError:
+            _entries = {}
+        except Exception as e:
+            logger.error("Ошибка чтения реестра медиа %s: %s", MEDIA_CACHE_FILE, e)
+            _entries = {}
+    return _entries
+
+
+def _save():
+    directory = os.path.dirname(MEDIA_CACHE_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    atomic_write_json(MEDIA_CACHE_FILE, _entries)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    """(sha256, mtime_ns, size) файла; хэш берётся из реестра, если файл не менялся."""
+    stat = os.stat(path)
+    with _lock:
+        entry = _load().get(path)
+    if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+        return entry["sha256"], stat.st_mtime_ns, stat.st_size
+    return _file_hash(path), stat.st_mtime_ns, stat.st_size
+
+
+def cached_file_id(path):
+    """file_id для актуального содержимого файла или None."""
+    sha256, mtime_ns, size = _fingerprint(path)
+    with _lock:
+        entries = _load()
+        entry = entries.get(path)
+        if entry is None:
+            return None
+        if entry.get("sha256") != sha256:
+            logger.info("Файл %s изменился, сохранённый file_id сброшен", path)
+            del entries[path]
+            _save()
+            return None
+        if entry.get("mtime_ns") != mtime_ns or entry.get("size") != size:
+            # Содержимое то же (например, файл скопирован заново) — запоминаем новые mtime и размер
+            entry.update(mtime_ns=mtime_ns, size=size)
+            _save()
+        return entry.get("file_id")
+
+
+def remember_file_id(path, file_id):
+    """Сохраняет file_id, полученный после загрузки файла path."""
+    sha256, mtime_ns, size = _fingerprint(path)
+    with _lock:
+        _load()[path] = {"sha256": sha256, "mtime_ns": mtime_ns, "size": size, "file_id": file_id}
+        _save()
+
+
+def forget_file_id(path):
+    with _lock:
+        if _load().pop(path, None) is not None:
+            _save()
+
+
+def _message_file_id(message, kind):
+    media = getattr(message, kind, None)
+    if isinstance(media, list):
+        # Для фото Telegram возвращает несколько размеров; берём самый крупный
+        media = media[-1] if media else None
+    return media.file_id if media is not None else None
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def send_cached_media(send, kind, path, **kwargs):
+    """
+    Отправляет файл path методом send (например, message.answer_photo или
+    bot.send_video), передавая его в аргументе kind ("photo", "video", ...).
+    Если файл уже загружался, отправляется его file_id.
+    """
+    file_id = await _run(cached_file_id, path)
+    if file_id:
+        try:
+            return await send(**{kind: file_id}, **kwargs)
+        except TelegramBadRequest as e:
+            # file_id перестал действовать (например, сменился токен бота) — загружаем файл заново
+            logger.warning("file_id для %s не принят Telegram: %s", path, e)
+            await _run(forget_file_id, path)
+
+    message = await send(**{kind: FSInputFile(path)}, **kwargs)
+    file_id = _message_file_id(message, kind)
+    if file_id:
+        await _run(remember_file_id, path, file_id)
+        logger.info("Файл %s загружен, file_id сохранён", path)
+    return message
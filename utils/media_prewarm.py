@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+from config import MEDIA_PREWARM_CHAT_ID
+from utils.media_cache import send_cached_media, cached_file_id
+from utils.training_content import get_training_content
+from utils.rate_limiter import outbound_priority, BACKGROUND
+
+# Предварительная загрузка медиа при старте бота. Все изображения из
+# обучающих материалов и файлы из images/ и video/ отправляются в служебный
+# чат MEDIA_PREWARM_CHAT_ID, чтобы их file_id попали в реестр utils.media_cache
+# до того, как к уроку дойдёт первый стажёр. Работает в фоне; если чат
+# не задан, ничего не делает.
+logger = logging.getLogger(__name__)
+
+MEDIA_DIRS = ("images", "video")
+PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+VIDEO_EXTENSIONS = {".mp4", ".mov"}
+# Ход загрузки пишется в лог каждые PROGRESS_EVERY файлов
+PROGRESS_EVERY = 50
+
+_status = {"total": 0, "cached": 0, "uploaded": 0, "missing": 0, "failed": 0, "ready": False}
+_task = None
+
+
+def prewarm_status():
+    """Ход предварительной загрузки: сколько файлов всего, загружено, не найдено и т.д."""
+    return dict(_status)
+
+
+def media_paths():
+    """Пути ко всем медиафайлам, которые может отправить бот, без повторов."""
+    paths = []
+    content = get_training_content()
+    for lessons in content.sections.values():
+        for lesson in lessons.values():
+            images = [lesson.image] + [question.image for question in lesson.questions]
+            paths.extend(f"images/{image}" for image in images if image)
+    for directory in MEDIA_DIRS:
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)))
+    return list(dict.fromkeys(paths))
+
+
+def _media_kind(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PHOTO_EXTENSIONS:
+        return "photo", "send_photo"
+    if extension in VIDEO_EXTENSIONS:
+        return "video", "send_video"
+    return "document", "send_document"
+
+
+async def _upload(bot, chat_id, path):
+    # Ответы retry_after обрабатывает планировщик отправки utils.rate_limiter
+    kind, method = _media_kind(path)
+    return await send_cached_media(getattr(bot, method), kind, path, chat_id=chat_id, disable_notification=True)
+
+
+def _log_status(message):
+    status = prewarm_status()
+    logger.info(
+        "%s: из %s загружено %s, уже были %s, не найдено %s, ошибок %s", message, status["total"],
+        status["uploaded"], status["cached"], status["missing"], status["failed"],
+    )
+
+
+async def prewarm_media(bot, chat_id=MEDIA_PREWARM_CHAT_ID):
+    """Загружает в служебный чат все медиафайлы, которых ещё нет в реестре."""
+    # Загрузки уступают очередь ответам пользователям и уведомлениям
+    with outbound_priority(BACKGROUND):
+        return await _prewarm_media(bot, chat_id)
+
+
+async def _prewarm_media(bot, chat_id):
+    paths = media_paths()
+    _status.update(total=len(paths), cached=0, uploaded=0, missing=0, failed=0, ready=False)
+    logger.info("Предварительная загрузка медиа: %s файлов", len(paths))
+    for number, path in enumerate(paths, 1):
+        if number % PROGRESS_EVERY == 0:
+            _log_status("Предварительная загрузка медиа")
+        if not os.path.isfile(path):
+            _status["missing"] += 1
+            continue
+        try:
+            if await asyncio.get_running_loop().run_in_executor(None, cached_file_id, path):
+                _status["cached"] += 1
+                continue
+            await _upload(bot, chat_id, path)
+            _status["uploaded"] += 1
+        except Exception as e:
+            _status["failed"] += 1
+            logger.error("Не удалось загрузить %s: %s", path, e)
+    _status["ready"] = True
+    _log_status("Предварительная загрузка медиа завершена")
+    return prewarm_status()
+
+
+async def start_media_prewarm(bot):
+    """Запускает prewarm_media в фоне, если задан MEDIA_PREWARM_CHAT_ID."""
+    global _task
+    if not MEDIA_PREWARM_CHAT_ID:
+        return
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(prewarm_media(bot))
+
+
+async def stop_media_prewarm():
+    """Останавливает незавершённую загрузку при остановке бота и пишет в лог, сколько успели."""
+    global _task
+    if _task is None:
+        return
+    if not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _log_status("Предварительная загрузка медиа прервана")
+    _task = None
@@ -0,0 +1,192 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from config import (
+    TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_GROUP_RATE, TG_RETRY_AFTER_ATTEMPTS
+)
+
+# Планировщик исходящих запросов к Telegram. Подключается к сессии бота
+# как request-middleware и ограничивает отправку и редактирование сообщений
+# корзинами токенов: общей (~30 сообщений в секунду) и отдельной для
+# каждого чата (~1 в секунду, в группах ~20 в минуту). Ожидающие запросы
+# выстроены в очередь с приоритетом: ответы пользователю уходят раньше
+# уведомлений и фоновых загрузок. Ответ «Flood control» (retry_after)
+# приостанавливает чат или всю отправку на указанное время, и запрос
+# повторяется автоматически.
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+NOTIFICATION = 1
+BACKGROUND = 2
+
+_priority = ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Методы, на которые распространяются лимиты Telegram на отправку
+LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+@contextmanager
+def outbound_priority(level):
+    """Запросы внутри блока ставятся в очередь с приоритетом level."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд в корзине будет токен (0 — уже есть)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def idle(self, now):
+        return self.delay(now) == 0 and self.tokens >= self.capacity
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Request-middleware с корзинами токенов и приоритетной очередью."""
+
+    def __init__(self, global_rate=TG_GLOBAL_RATE, chat_rate=TG_CHAT_RATE, chat_burst=TG_CHAT_BURST,
+                 group_rate=TG_GROUP_RATE, retry_attempts=TG_RETRY_AFTER_ATTEMPTS):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.retry_attempts = retry_attempts
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._waiting = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self.stats = {"sent": 0, "retry_after": 0}
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id — группы и каналы, у них свой лимит
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, 1 if is_group else self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now):
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    async def acquire(self, chat_id, priority=INTERACTIVE):
+        """Ждёт разрешения на отправку в чат chat_id (None — только общий лимит) с учётом приоритета."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), chat_id, future))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            if not self._waiting:
+                self._prune(time.monotonic())
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            wait = self._global.delay(now)
+            if wait == 0:
+                wait = self._grant_next(now)
+            if wait is not None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _grant_next(self, now):
+        """
+        Разрешает самый приоритетный запрос, чей чат не исчерпал лимит.
+        Возвращает None, если запрос разрешён, иначе — сколько ждать.
+        """
+        deferred = []
+        wait = None
+        try:
+            while self._waiting:
+                item = heapq.heappop(self._waiting)
+                future = item[3]
+                if future.done():
+                    continue
+                # Запросы без chat_id (inline-ответы и т.п.) берут только общий токен
+                bucket = self._bucket(item[2]) if item[2] is not None else None
+                chat_delay = bucket.delay(now) if bucket is not None else 0
+                if chat_delay == 0:
+                    if bucket is not None:
+                        bucket.take()
+                    self._global.take()
+                    future.set_result(None)
+                    return None
+                deferred.append(item)
+                wait = chat_delay if wait is None else min(wait, chat_delay)
+            return wait
+        finally:
+            for item in deferred:
+                heapq.heappush(self._waiting, item)
+
+    def _on_retry_after(self, chat_id, seconds):
+        self.stats["retry_after"] += 1
+        if chat_id is None:
+            self._global.pause(seconds)
+        else:
+            self._bucket(chat_id).pause(seconds)
+        logger.warning("Telegram просит подождать %s с (чат %s)", seconds, chat_id if chat_id is not None else "все")
+
+    async def __call__(self, make_request, bot, method):
+        if not type(method).__name__.startswith(LIMITED_PREFIXES):
+            return await make_request(bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        priority = _priority.get()
+        for attempt in range(self.retry_attempts + 1):
+            await self.acquire(chat_id, priority)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.retry_attempts:
+                    raise
+                self._on_retry_after(chat_id, e.retry_after)
+                continue
+            self.stats["sent"] += 1
+            return response
+
+
+outbound_scheduler = OutboundScheduler()
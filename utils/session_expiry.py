@@ -0,0 +1,128 @@
+import time
+import heapq
+import itertools
+import asyncio
+import inspect
+import logging
+from collections import Counter
+from aiogram import BaseMiddleware
+from config import SESSION_TTL, SESSION_SWEEP_INTERVAL
+
+# Истечение брошенных сессий: ключи FSM (незаконченная регистрация, тест,
+# ожидание отзыва) и активные аттестации. Для каждой сессии запоминается
+# срок последней активности + SESSION_TTL; сроки лежат в куче, поэтому
+# проверка раз в SESSION_SWEEP_INTERVAL секунд смотрит только на истёкшие
+# записи, а не перебирает все сессии.
+logger = logging.getLogger(__name__)
+
+
+class SessionExpiry:
+    """Отслеживает активность сессий разных видов и выселяет простаивающие."""
+
+    def __init__(self, ttl=SESSION_TTL, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._deadlines = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._evictors = {}
+        self._task = None
+        self.evicted = Counter()
+
+    def register(self, kind, evictor):
+        """evictor(key) — функция или корутина, удаляющая сессию вида kind."""
+        self._evictors[kind] = evictor
+
+    def touch(self, kind, key, now=None):
+        """Отмечает активность сессии и продлевает её срок."""
+        deadline = (time.monotonic() if now is None else now) + self.ttl
+        self._deadlines[(kind, key)] = deadline
+        # Старая запись в куче не удаляется: при извлечении она будет
+        # пропущена, потому что её срок не совпадёт с актуальным
+        heapq.heappush(self._heap, (deadline, next(self._seq), kind, key))
+        if len(self._heap) > 4 * len(self._deadlines) + 64:
+            self._compact()
+
+    def discard(self, kind, key):
+        """Снимает сессию с учёта (например, тест завершён штатно)."""
+        self._deadlines.pop((kind, key), None)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _compact(self):
+        self._heap = [
+            (deadline, next(self._seq), kind, key) for (kind, key), deadline in self._deadlines.items()
+        ]
+        heapq.heapify(self._heap)
+
+    async def sweep(self, now=None):
+        """Выселяет истёкшие сессии; возвращает Counter {вид: число выселенных}."""
+        now = time.monotonic() if now is None else now
+        evicted = Counter()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, kind, key = heapq.heappop(self._heap)
+            if self._deadlines.get((kind, key)) != deadline:
+                continue
+            del self._deadlines[(kind, key)]
+            evictor = self._evictors.get(kind)
+            if evictor is None:
+                continue
+            try:
+                result = evictor(key)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("Ошибка выселения сессии %s %s: %s", kind, key, e)
+                continue
+            evicted[kind] += 1
+        if evicted:
+            self.evicted.update(evicted)
+            logger.info(
+                "Выселено простаивающих сессий: %s (осталось %s)",
+                ", ".join(f"{kind}={count}" for kind, count in sorted(evicted.items())),
+                len(self._deadlines),
+            )
+        return evicted
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("Истечение сессий запущено: TTL %s с, проверка раз в %s с", self.ttl, self.sweep_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        logger.info("Всего выселено сессий: %s", dict(self.evicted))
+
+
+session_expiry = SessionExpiry()
+
+
+def track_fsm_storage(storage, expiry=session_expiry):
+    """
+    Подключает FSM-хранилище: уже сохранённые ключи получают полный TTL
+    с момента запуска, истёкшие ключи удаляются через storage.forget().
+    """
+    expiry.register("fsm", storage.forget)
+    for key in storage.keys():
+        expiry.touch("fsm", key)
+
+
+class SessionActivityMiddleware(BaseMiddleware):
+    """Отмечает активность ключа FSM на каждом апдейте пользователя."""
+
+    def __init__(self, expiry=session_expiry):
+        self.expiry = expiry
+
+    async def __call__(self, handler, event, data):
+        state = data.get("state")
+        if state is not None:
+            self.expiry.touch("fsm", state.key)
+        return await handler(event, data)
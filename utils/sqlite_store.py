@@ -0,0 +1,364 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from config import USER_DB_FILE, USER_DATA_PATH
+
+# Хранилище профилей в SQLite (включается USER_STORAGE = "sqlite" в config.py).
+# Профиль раскладывается на три таблицы: основные поля, уроки course_plan и
+# записи mistakes. Отметка одного урока или задания меняет одну строку,
+# а не переписывает весь JSON-документ пользователя.
+logger = logging.getLogger(__name__)
+
+# Поле mentor в профиле стажёра — словарь с id или сам id наставника
+MENTOR_EXPR = (
+    "(CASE json_type(data, '$.mentor') WHEN 'object' "
+    "THEN json_extract(data, '$.mentor.id') ELSE json_extract(data, '$.mentor') END)"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    has_course_plan INTEGER NOT NULL DEFAULT 0,
+    has_mistakes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_city_role ON users (json_extract(data, '$.city'), json_extract(data, '$.role'));
+CREATE INDEX IF NOT EXISTS users_mentor ON users (""" + MENTOR_EXPR + """);
+CREATE TABLE IF NOT EXISTS course_plan (
+    user_id TEXT NOT NULL,
+    section TEXT NOT NULL,
+    section_pos INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, section_pos, pos)
+);
+CREATE INDEX IF NOT EXISTS course_plan_lesson ON course_plan (user_id, section, title);
+CREATE TABLE IF NOT EXISTS legacy_trainees (
+    mentor_id TEXT NOT NULL,
+    trainee_id TEXT NOT NULL,
+    PRIMARY KEY (mentor_id, trainee_id)
+);
+CREATE INDEX IF NOT EXISTS legacy_trainees_trainee ON legacy_trainees (trainee_id);
+CREATE TABLE IF NOT EXISTS mistakes (
+    user_id TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (user_id, pos)
+);
+"""
+
+# Запросы задаются константами: модуль sqlite3 кэширует скомпилированные
+# выражения по тексту запроса, так что каждый из них готовится один раз.
+SELECT_USER = "SELECT data, has_course_plan, has_mistakes FROM users WHERE user_id = ?"
+SELECT_USER_IDS = "SELECT user_id FROM users"
+SELECT_BY_CITY_ROLE = (
+    "SELECT user_id FROM users "
+    "WHERE json_extract(data, '$.city') = ? AND json_extract(data, '$.role') = ?"
+)
+SELECT_BY_MENTOR = "SELECT user_id FROM users WHERE " + MENTOR_EXPR + " IN (?, ?)"
+SELECT_MENTOR_LINK = "SELECT " + MENTOR_EXPR + ", json_extract(data, '$.role') FROM users WHERE user_id = ?"
+# Карты "Trainee" наставников разложены в legacy_trainees (см. _sync_legacy_trainees)
+SELECT_LEGACY_TRAINEES = "SELECT trainee_id FROM legacy_trainees WHERE mentor_id = ?"
+SELECT_LEGACY_MENTORS = "SELECT mentor_id FROM legacy_trainees WHERE trainee_id = ? ORDER BY mentor_id"
+DELETE_LEGACY_TRAINEES = "DELETE FROM legacy_trainees WHERE mentor_id = ?"
+INSERT_LEGACY_TRAINEE = "INSERT OR IGNORE INTO legacy_trainees (mentor_id, trainee_id) VALUES (?, ?)"
+SELECT_LEGACY_MAPS = "SELECT user_id FROM users WHERE json_type(data, '$.Trainee') IS NOT NULL ORDER BY user_id"
+SELECT_LESSONS = "SELECT section, data FROM course_plan WHERE user_id = ? ORDER BY section_pos, pos"
+SELECT_LESSON = "SELECT rowid, data FROM course_plan WHERE user_id = ? AND section = ? AND title = ? ORDER BY pos LIMIT 1"
+SELECT_MISTAKES = "SELECT data FROM mistakes WHERE user_id = ? ORDER BY pos"
+SELECT_MISTAKE = "SELECT data FROM mistakes WHERE user_id = ? AND pos = ?"
+SELECT_NEXT_MISTAKE_POS = "SELECT COALESCE(MAX(pos) + 1, 0) FROM mistakes WHERE user_id = ?"
+UPSERT_USER = """
+INSERT INTO users (user_id, data, has_course_plan, has_mistakes) VALUES (?, ?, ?, ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    data = excluded.data,
+    has_course_plan = excluded.has_course_plan,
+    has_mistakes = excluded.has_mistakes
+"""
+UPDATE_USER_DATA = "UPDATE users SET data = ? WHERE user_id = ?"
+SET_HAS_COURSE_PLAN = "UPDATE users SET has_course_plan = ? WHERE user_id = ?"
+SET_HAS_MISTAKES = "UPDATE users SET has_mistakes = ? WHERE user_id = ?"
+INSERT_LESSON = "INSERT INTO course_plan (user_id, section, section_pos, pos, title, data) VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_LESSON = "UPDATE course_plan SET data = ? WHERE rowid = ?"
+DELETE_LESSONS = "DELETE FROM course_plan WHERE user_id = ?"
+INSERT_MISTAKE = "INSERT INTO mistakes (user_id, pos, data) VALUES (?, ?, ?)"
+UPDATE_MISTAKE = "UPDATE mistakes SET data = ? WHERE user_id = ? AND pos = ?"
+DELETE_MISTAKES = "DELETE FROM mistakes WHERE user_id = ?"
+
+_SPLIT_KEYS = ("course_plan", "mistakes")
+# Версия 2: карты "Trainee" перенесены в поле mentor стажёров, остаток — в legacy_trainees
+SCHEMA_VERSION = 2
+
+_connection = None
+_lock = threading.Lock()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def merge_fields(target, changes):
+    """Применяет изменения к словарю: значение None удаляет ключ."""
+    for key, value in changes.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+
+
+def _connect():
+    global _connection
+    if _connection is None:
+        directory = os.path.dirname(USER_DB_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(USER_DB_FILE, check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        _connection = connection
+        logger.info("Хранилище профилей SQLite открыто: %s", USER_DB_FILE)
+        if connection.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            _import_json_users(connection)
+        if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            _migrate_legacy_trainees(connection)
+    return _connection
+
+
+def _write_course_plan(connection, user_id, course_plan):
+    connection.execute(DELETE_LESSONS, (user_id,))
+    for section_pos, (section, lessons) in enumerate(course_plan.items()):
+        for pos, lesson in enumerate(lessons):
+            connection.execute(
+                INSERT_LESSON,
+                (user_id, section, section_pos, pos, lesson.get("title", ""), _dumps(lesson))
+            )
+
+
+def _write_mistakes(connection, user_id, mistakes):
+    connection.execute(DELETE_MISTAKES, (user_id,))
+    for pos, mistake in enumerate(mistakes):
+        connection.execute(INSERT_MISTAKE, (user_id, pos, _dumps(mistake)))
+
+
+def _sync_legacy_trainees(connection, user_id, data):
+    # Таблица повторяет ключи карты "Trainee" профиля: поиск по ней идёт
+    # по индексу, а не разбором JSON всех профилей
+    connection.execute(DELETE_LEGACY_TRAINEES, (user_id,))
+    for trainee_id in data.get("Trainee") or {}:
+        connection.execute(INSERT_LEGACY_TRAINEE, (user_id, str(trainee_id)))
+
+
+def _save(connection, user_id, data):
+    base = {key: value for key, value in data.items() if key not in _SPLIT_KEYS}
+    connection.execute(
+        UPSERT_USER,
+        (user_id, _dumps(base), int("course_plan" in data), int("mistakes" in data))
+    )
+    _write_course_plan(connection, user_id, data.get("course_plan") or {})
+    _write_mistakes(connection, user_id, data.get("mistakes") or [])
+    _sync_legacy_trainees(connection, user_id, data)
+
+
+def _import_json_users(connection):
+    """Переносит существующие user_<id>.json в пустую базу."""
+    if not os.path.isdir(USER_DATA_PATH):
+        return
+    imported = 0
+    with connection:
+        for name in sorted(os.listdir(USER_DATA_PATH)):
+            if not (name.startswith("user_") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(USER_DATA_PATH, name), "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except Exception as e:
+                logger.error("Не удалось импортировать %s: %s", name, e)
+                continue
+            _save(connection, name[len("user_"):-len(".json")], data)
+            imported += 1
+    logger.info("Импортировано профилей из JSON в SQLite: %s", imported)
+
+
+def _migrate_legacy_trainees(connection):
+    """
+    Однократный перенос старых карт "Trainee" из профилей наставников в поле
+    mentor профилей стажёров. Связь из профиля стажёра важнее, сотрудникам
+    наставник не нужен; при нескольких наставниках берётся первый по id.
+    Стажёры без профиля остаются в карте и в таблице legacy_trainees.
+    Версия схемы (PRAGMA user_version) отмечает перенос.
+    """
+    linked = kept = 0
+    with connection:
+        for (mentor_id,) in connection.execute(SELECT_LEGACY_MAPS).fetchall():
+            # Профиль читается заново: наставник мог сам получить поле mentor выше
+            base = json.loads(connection.execute(SELECT_USER, (mentor_id,)).fetchone()[0])
+            remaining = {}
+            for trainee_id, trainee_info in (base.get("Trainee") or {}).items():
+                row = connection.execute(SELECT_USER, (str(trainee_id),)).fetchone()
+                if row is None:
+                    remaining[trainee_id] = trainee_info
+                    continue
+                trainee = json.loads(row[0])
+                if trainee.get("mentor") not in (None, "") or trainee.get("role") == "Employee":
+                    continue
+                trainee["mentor"] = mentor_id
+                connection.execute(UPDATE_USER_DATA, (_dumps(trainee), str(trainee_id)))
+                linked += 1
+            merge_fields(base, {"Trainee": remaining or None})
+            connection.execute(UPDATE_USER_DATA, (_dumps(base), mentor_id))
+            _sync_legacy_trainees(connection, mentor_id, base)
+            kept += len(remaining)
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    logger.info(
+        'Связи стажёров из карт "Trainee" перенесены в поле mentor: %s, оставлены в картах (нет профиля): %s',
+        linked, kept,
+    )
+
+
+def user_exists(user_id):
+    with _lock:
+        return _connect().execute(SELECT_USER, (str(user_id),)).fetchone() is not None
+
+
+def list_user_ids():
+    with _lock:
+        return [row[0] for row in _connect().execute(SELECT_USER_IDS)]
+
+
+def find_user_ids(city, roles):
+    """Id пользователей с заданным городом и ролью (по индексу users_city_role)."""
+    ids = set()
+    with _lock:
+        connection = _connect()
+        for role in roles:
+            ids.update(row[0] for row in connection.execute(SELECT_BY_CITY_ROLE, (city, role)))
+    return sorted(ids)
+
+
+def _id_params(value):
+    value = str(value)
+    return (int(value) if value.lstrip("-").isdigit() else value, value)
+
+
+def _legacy_link_active(connection, trainee_id):
+    # Та же логика, что в utils.user_index: связь из карты "Trainee"
+    # наставника учитывается, только если у стажёра нет поля mentor и он не сотрудник
+    row = connection.execute(SELECT_MENTOR_LINK, (trainee_id,)).fetchone()
+    return row is None or (row[0] is None and row[1] != "Employee")
+
+
+def trainee_ids_of(mentor_id):
+    """Id стажёров наставника (по индексам users_mentor и legacy_trainees)."""
+    with _lock:
+        connection = _connect()
+        ids = {row[0] for row in connection.execute(SELECT_BY_MENTOR, _id_params(mentor_id))}
+        for (trainee_id,) in connection.execute(SELECT_LEGACY_TRAINEES, (str(mentor_id),)).fetchall():
+            if _legacy_link_active(connection, trainee_id):
+                ids.add(trainee_id)
+    return sorted(ids)
+
+
+def mentor_id_of(trainee_id):
+    """Id наставника стажёра или None."""
+    trainee_id = str(trainee_id)
+    with _lock:
+        connection = _connect()
+        row = connection.execute(SELECT_MENTOR_LINK, (trainee_id,)).fetchone()
+        if row is not None and row[0] is not None:
+            return str(row[0])
+        if not _legacy_link_active(connection, trainee_id):
+            return None
+        row = connection.execute(SELECT_LEGACY_MENTORS, (trainee_id,)).fetchone()
+    return row[0] if row else None
+
+
+def load_user(user_id):
+    """Собирает профиль пользователя. Возвращает None, если его нет."""
+    user_id = str(user_id)
+    with _lock:
+        connection = _connect()
+        row = connection.execute(SELECT_USER, (user_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        if row[1]:
+            course_plan = {}
+            for section, lesson in connection.execute(SELECT_LESSONS, (user_id,)):
+                course_plan.setdefault(section, []).append(json.loads(lesson))
+            data["course_plan"] = course_plan
+        if row[2]:
+            data["mistakes"] = [json.loads(m) for (m,) in connection.execute(SELECT_MISTAKES, (user_id,))]
+    return data
+
+
+def save_user(user_id, data):
+    """Полностью перезаписывает профиль пользователя."""
+    with _lock:
+        connection = _connect()
+        with connection:
+            _save(connection, str(user_id), data)
+
+
+def update_user(user_id, fields=None, lessons=None, new_mistakes=None, mistake_updates=None):
+    """
+    Частичное обновление профиля в одной транзакции. Затрагиваются только
+    изменённые строки. Возвращает False, если профиль не найден.
+    """
+    user_id = str(user_id)
+    with _lock:
+        connection = _connect()
+        with connection:
+            row = connection.execute(SELECT_USER, (user_id,)).fetchone()
+            if row is None:
+                return False
+
+            fields = dict(fields or {})
+            if "course_plan" in fields:
+                course_plan = fields.pop("course_plan")
+                _write_course_plan(connection, user_id, course_plan or {})
+                connection.execute(SET_HAS_COURSE_PLAN, (int(course_plan is not None), user_id))
+            if "mistakes" in fields:
+                mistakes = fields.pop("mistakes")
+                _write_mistakes(connection, user_id, mistakes or [])
+                connection.execute(SET_HAS_MISTAKES, (int(mistakes is not None), user_id))
+            if fields:
+                base = json.loads(row[0])
+                merge_fields(base, fields)
+                connection.execute(UPDATE_USER_DATA, (_dumps(base), user_id))
+                if "Trainee" in fields:
+                    _sync_legacy_trainees(connection, user_id, base)
+
+            for (section, title), changes in (lessons or {}).items():
+                lesson_row = connection.execute(SELECT_LESSON, (user_id, section, title)).fetchone()
+                if lesson_row is None:
+                    continue
+                lesson = json.loads(lesson_row[1])
+                merge_fields(lesson, changes)
+                connection.execute(UPDATE_LESSON, (_dumps(lesson), lesson_row[0]))
+
+            if new_mistakes:
+                pos = connection.execute(SELECT_NEXT_MISTAKE_POS, (user_id,)).fetchone()[0]
+                for offset, mistake in enumerate(new_mistakes):
+                    connection.execute(INSERT_MISTAKE, (user_id, pos + offset, _dumps(mistake)))
+                connection.execute(SET_HAS_MISTAKES, (1, user_id))
+
+            for index, changes in (mistake_updates or {}).items():
+                mistake_row = connection.execute(SELECT_MISTAKE, (user_id, index)).fetchone()
+                if mistake_row is None:
+                    continue
+                mistake = json.loads(mistake_row[0])
+                merge_fields(mistake, changes)
+                connection.execute(UPDATE_MISTAKE, (_dumps(mistake), user_id, index))
+    return True
+
+
+def close():
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
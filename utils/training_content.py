@@ -0,0 +1,124 @@
+import os
+import json
+import logging
+import threading
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+from config import TRAINING_DATA_FILE
+
+# Реестр обучающих материалов. data/training_data.json разбирается один раз
+# в неизменяемую структуру раздел → урок → вопросы и перечитывается целиком,
+# только когда у файла меняется mtime: правки материалов подхватываются без
+# перезапуска бота, а обработчики не разбирают JSON на каждом уроке и вопросе.
+logger = logging.getLogger(__name__)
+
+QUESTION_KEY = "Вопрос {number}"
+
+
+class Question(NamedTuple):
+    number: int
+    text: str
+    image: Optional[str]
+    correct_answer: object
+    quest: str
+
+
+class Lesson(NamedTuple):
+    section: str
+    title: str
+    text: Optional[str]
+    image: Optional[str]
+    questions: tuple
+
+    @property
+    def is_test(self):
+        return bool(self.questions)
+
+    @property
+    def question_count(self):
+        return len(self.questions)
+
+    def question(self, number):
+        """Вопрос с номером number (нумерация с 1) или None."""
+        if 1 <= number <= len(self.questions):
+            return self.questions[number - 1]
+        return None
+
+
+class TrainingContent:
+    """Неизменяемый снимок обучающих материалов."""
+
+    def __init__(self, raw, mtime_ns=None):
+        self.mtime_ns = mtime_ns
+        sections = {}
+        for section, lessons in raw.items():
+            sections[section] = MappingProxyType({
+                title: _compile_lesson(section, title, lesson) for title, lesson in lessons.items()
+            })
+        self.sections = MappingProxyType(sections)
+
+    def section(self, section):
+        return self.sections.get(section)
+
+    def lesson(self, section, title):
+        lessons = self.sections.get(section)
+        return lessons.get(title) if lessons is not None else None
+
+
+def _compile_lesson(section, title, lesson):
+    questions = []
+    number = 1
+    while QUESTION_KEY.format(number=number) in lesson:
+        question = lesson[QUESTION_KEY.format(number=number)]
+        questions.append(Question(
+            number=number,
+            text=question.get("text", "Нет текста вопроса"),
+            image=question.get("image"),
+            correct_answer=question.get("correct_answer", "Неизвестно"),
+            quest=question.get("quest", "Нет дополнительного задания"),
+        ))
+        number += 1
+    return Lesson(
+        section=section,
+        title=title,
+        text=lesson.get("text"),
+        image=lesson.get("image"),
+        questions=tuple(questions),
+    )
+
+
+_EMPTY = TrainingContent({})
+_content = _EMPTY
+_failed_mtime_ns = None
+_lock = threading.Lock()
+
+
+def get_training_content():
+    """
+    Текущий снимок материалов. Файл перечитывается только при изменении mtime;
+    новый снимок подменяет старый целиком, поэтому обработчик, уже получивший
+    снимок, дорабатывает с согласованными данными.
+    """
+    global _content, _failed_mtime_ns
+    try:
+        mtime_ns = os.stat(TRAINING_DATA_FILE).st_mtime_ns
+    except OSError:
+        if _content is not _EMPTY:
+            logger.warning("Файл обучающих материалов %s не найден", TRAINING_DATA_FILE)
+            _content = _EMPTY
+        return _content
+    if mtime_ns in (_content.mtime_ns, _failed_mtime_ns):
+        return _content
+    with _lock:
+        if mtime_ns not in (_content.mtime_ns, _failed_mtime_ns):
+            try:
+                with open(TRAINING_DATA_FILE, "r", encoding="utf-8") as file:
+                    raw = json.load(file)
+                _content = TrainingContent(raw, mtime_ns)
+                logger.info("Обучающие материалы загружены из %s", TRAINING_DATA_FILE)
+            except Exception as e:
+                # Оставляем предыдущий снимок: битый файл не должен ломать обучение.
+                # Повторно файл читается только после следующего изменения.
+                _failed_mtime_ns = mtime_ns
+                logger.error("Ошибка загрузки обучающих данных из %s: %s", TRAINING_DATA_FILE, e)
+    return _content
@@ -0,0 +1,87 @@
+import copy
+import logging
+from aiogram import BaseMiddleware
+from utils.json_utils import load_user_data_async, update_user_data_async, user_lock
+from utils.sqlite_store import merge_fields
+
+# Профиль пользователя на время одного апдейта. Middleware читает профиль
+# один раз до обработчиков и передаёт его в данные обработчика (user_context,
+# user_profile, user_role). Изменения копятся в UserContext и в конце апдейта
+# записываются одним частичным обновлением (update_user_data_async), поэтому
+# правки других обработчиков и наставников в этом профиле не затираются.
+# Middleware подключается после ChatSequentialMiddleware: апдейты одного
+# пользователя идут по очереди, и каждый видит записанное предыдущим.
+logger = logging.getLogger(__name__)
+
+
+class UserContext:
+    """Снимок профиля и накопленные изменения для одного апдейта."""
+
+    def __init__(self, user_id, profile):
+        self.user_id = user_id
+        # Копия: кэш профилей не должен видеть незаписанные изменения
+        self.profile = copy.deepcopy(profile)
+        self._fields = {}
+        self._lessons = {}
+        self._new_mistakes = []
+
+    @property
+    def exists(self):
+        return self.profile is not None
+
+    @property
+    def role(self):
+        return self.profile.get("role") if self.profile else None
+
+    @property
+    def dirty(self):
+        return bool(self._fields or self._lessons or self._new_mistakes)
+
+    def update(self, **fields):
+        """Меняет поля верхнего уровня (None удаляет поле)."""
+        merge_fields(self.profile, fields)
+        self._fields.update(fields)
+
+    def update_lesson(self, section, title, **changes):
+        """Меняет запись урока title раздела section в course_plan."""
+        for lesson in self.profile.get("course_plan", {}).get(section, []):
+            if lesson.get("title") == title:
+                merge_fields(lesson, changes)
+                break
+        self._lessons.setdefault((section, title), {}).update(changes)
+
+    def add_mistake(self, entry):
+        """Добавляет запись в конец mistakes."""
+        self.profile.setdefault("mistakes", []).append(entry)
+        self._new_mistakes.append(entry)
+
+    async def commit(self):
+        """Записывает накопленные изменения одним обновлением."""
+        if not self.exists or not self.dirty:
+            return
+        fields, lessons, new_mistakes = self._fields, self._lessons, self._new_mistakes
+        self._fields, self._lessons, self._new_mistakes = {}, {}, []
+        async with user_lock(self.user_id):
+            await update_user_data_async(
+                self.user_id, fields=fields or None, lessons=lessons or None, new_mistakes=new_mistakes or None
+            )
+
+
+class UserProfileMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: профиль читается один раз, изменения пишутся один раз."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        # Inline-запросам профиль не нужен
+        if user is None or event.inline_query is not None:
+            return await handler(event, data)
+        context = UserContext(user.id, await load_user_data_async(user.id))
+        data["user_context"] = context
+        data["user_profile"] = context.profile
+        data["user_role"] = context.role
+        try:
+            return await handler(event, data)
+        finally:
+            # Изменения, сделанные до ошибки, тоже сохраняются, как и раньше
+            # при немедленной записи
+            await context.commit()
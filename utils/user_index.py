@@ -0,0 +1,150 @@
+import os
+import json
+import logging
+import threading
+from collections import defaultdict
+from config import USER_DATA_PATH
+
+# Вторичные индексы по профилям JSON-хранилища. Обновляются при каждом
+# сохранении профиля через utils.json_utils и при необходимости полностью
+# перестраиваются по файлам data/users/user_<id>.json.
+logger = logging.getLogger(__name__)
+
+
+def mentor_id_of(data):
+    """Id наставника из профиля стажёра: поле mentor хранится как словарь с id или как id."""
+    mentor = data.get("mentor")
+    if isinstance(mentor, dict):
+        mentor = mentor.get("id")
+    return str(mentor) if mentor not in (None, "") else None
+
+
+def _discard(index, key, value):
+    bucket = index.get(key)
+    if bucket is not None:
+        bucket.discard(value)
+        if not bucket:
+            del index[key]
+
+
+class UserIndex:
+    """
+    Индексы по профилям:
+      (город, роль) → множество id пользователей;
+      наставник ↔ стажёры по полю mentor в профиле стажёра.
+    Карта "Trainee" в профиле наставника — запасной источник связей: после
+    переноса (json_utils.migrate_legacy_trainees) в ней остаются только
+    стажёры без локального профиля. Связь из карты действует, пока у
+    стажёра нет поля mentor и он не переведён в сотрудники.
+    """
+
+    def __init__(self, users_path=USER_DATA_PATH):
+        self.users_path = users_path
+        self._by_city_role = defaultdict(set)
+        self._city_role_of = {}
+        self._mentor_of = {}
+        self._trainees_of = defaultdict(set)
+        self._legacy_trainees_of = defaultdict(set)
+        self._legacy_mentor_of = defaultdict(set)
+        self._built = False
+        self._lock = threading.RLock()
+
+    def _remove(self, user_id):
+        key = self._city_role_of.pop(user_id, None)
+        if key is not None:
+            _discard(self._by_city_role, key, user_id)
+        mentor_id = self._mentor_of.pop(user_id, None)
+        if mentor_id is not None:
+            _discard(self._trainees_of, mentor_id, user_id)
+        for trainee_id in self._legacy_trainees_of.pop(user_id, ()):
+            _discard(self._legacy_mentor_of, trainee_id, user_id)
+
+    def _add(self, user_id, data):
+        key = (data.get("city"), data.get("role"))
+        self._city_role_of[user_id] = key
+        self._by_city_role[key].add(user_id)
+        mentor_id = mentor_id_of(data)
+        if mentor_id is not None:
+            self._mentor_of[user_id] = mentor_id
+            self._trainees_of[mentor_id].add(user_id)
+        for trainee_id in data.get("Trainee") or {}:
+            self._legacy_trainees_of[user_id].add(str(trainee_id))
+            self._legacy_mentor_of[str(trainee_id)].add(user_id)
+
+    def _legacy_link_active(self, trainee_id):
+        # Запасная связь действует, пока у стажёра нет своего поля mentor
+        # и он не переведён в сотрудники
+        if trainee_id in self._mentor_of:
+            return False
+        key = self._city_role_of.get(trainee_id)
+        return key is None or key[1] != "Employee"
+
+    def update(self, user_id, data):
+        """Обновляет индекс после сохранения профиля (data=None — профиль удалён)."""
+        user_id = str(user_id)
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(user_id)
+            if data is not None:
+                self._add(user_id, data)
+
+    def rebuild(self):
+        """Перестраивает индекс, читая все профили с диска."""
+        with self._lock:
+            for index in (self._by_city_role, self._city_role_of, self._mentor_of, self._trainees_of,
+                          self._legacy_trainees_of, self._legacy_mentor_of):
+                index.clear()
+            count = 0
+            if os.path.isdir(self.users_path):
+                for name in os.listdir(self.users_path):
+                    if not (name.startswith("user_") and name.endswith(".json")):
+                        continue
+                    try:
+                        with open(os.path.join(self.users_path, name), "r", encoding="utf-8") as file:
+                            data = json.load(file)
+                    except Exception as e:
+                        logger.error("Не удалось проиндексировать %s: %s", name, e)
+                        continue
+                    self._add(name[len("user_"):-len(".json")], data)
+                    count += 1
+            self._built = True
+            logger.info("Индекс пользователей перестроен: %s профилей", count)
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def find(self, city, roles):
+        """Возвращает отсортированный список id пользователей с городом city и ролью из roles."""
+        with self._lock:
+            self._ensure_built()
+            ids = set()
+            for role in roles:
+                ids |= self._by_city_role.get((city, role), set())
+        return sorted(ids)
+
+    def trainees_of(self, mentor_id):
+        """Id стажёров наставника mentor_id."""
+        mentor_id = str(mentor_id)
+        with self._lock:
+            self._ensure_built()
+            ids = set(self._trainees_of.get(mentor_id, ()))
+            ids.update(
+                trainee_id for trainee_id in self._legacy_trainees_of.get(mentor_id, ())
+                if self._legacy_link_active(trainee_id)
+            )
+        return sorted(ids)
+
+    def mentor_of(self, trainee_id):
+        """Id наставника стажёра trainee_id или None."""
+        trainee_id = str(trainee_id)
+        with self._lock:
+            self._ensure_built()
+            mentor_id = self._mentor_of.get(trainee_id)
+            if mentor_id is None and self._legacy_link_active(trainee_id):
+                mentor_id = min(self._legacy_mentor_of.get(trainee_id, ()), default=None)
+        return mentor_id
+
+
+user_index = UserIndex()
@@ -0,0 +1,114 @@
+import signal
+import asyncio
+import logging
+import secrets
+from aiohttp import web
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_SET_ON_START, WEBHOOK_SHUTDOWN_TIMEOUT
+)
+
+# Режим webhook: Telegram сам присылает обновления POST-запросами на
+# WEBHOOK_URL + WEBHOOK_PATH, поэтому нет пауз long polling после обрывов
+# соединения. Встроенный сервер aiohttp слушает WEBHOOK_HOST:WEBHOOK_PORT
+# (обычно за reverse proxy с TLS) и принимает только запросы с заголовком
+# X-Telegram-Bot-Api-Secret-Token, равным WEBHOOK_SECRET.
+#
+# Локальная проверка: WEBHOOK_URL=http://localhost:8080, WEBHOOK_SET_ON_START=0,
+# WEBHOOK_SECRET=test, затем записанные обновления отправляются так:
+#   curl -H "X-Telegram-Bot-Api-Secret-Token: test" -H "Content-Type: application/json" \
+#        -d @update.json http://localhost:8080/webhook
+logger = logging.getLogger(__name__)
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """
+    Отвечает Telegram сразу, а обновление обрабатывает в фоновой задаче.
+    Задачи учитываются здесь же, чтобы при остановке дождаться начатых.
+    """
+
+    def __init__(self, dispatcher, bot, secret_token=None, **data):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=False, secret_token=secret_token, **data)
+        self.tasks = set()
+
+    async def _feed(self, bot, update):
+        result = await self.dispatcher.feed_raw_update(bot=bot, update=update, **self.data)
+        # Ответ обработчика через webhook уже не вернуть — отправляем запросом
+        if isinstance(result, TelegramMethod):
+            await self.dispatcher.silent_call_request(bot=bot, result=result)
+
+    async def handle(self, request):
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        update = await request.json(loads=bot.session.json_loads)
+        task = asyncio.get_running_loop().create_task(self._feed(bot, update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def wait_updates(self, timeout):
+        """Дожидается обновлений, которые ещё обрабатываются в фоне."""
+        tasks = set(self.tasks)
+        if not tasks:
+            return
+        logger.info("Ожидание обработки %s обновлений", len(tasks))
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning("Не дождались обработки %s обновлений", len(pending))
+
+
+def build_app(dp, bot, secret_token):
+    """Приложение aiohttp с обработчиком обновлений и жизненным циклом диспетчера."""
+    app = web.Application()
+    handler = WebhookRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token)
+    handler.register(app, path=WEBHOOK_PATH)
+    # startup/shutdown диспетчера вызываются при запуске и остановке приложения
+    setup_application(app, dp, bot=bot)
+    return app, handler
+
+
+async def run_webhook(dp, bot):
+    """Запускает сервер webhook и работает до SIGINT/SIGTERM."""
+    # Без заданного секрета используется случайный: чужие запросы всё равно отклоняются
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    app, handler = build_app(dp, bot, secret_token)
+
+    if WEBHOOK_SET_ON_START:
+        async def set_webhook(_):
+            await bot.set_webhook(
+                WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=secret_token,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("Webhook установлен: %s%s", WEBHOOK_URL.rstrip("/"), WEBHOOK_PATH)
+        app.on_startup.append(set_webhook)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info("Сервер webhook слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по KeyboardInterrupt
+            pass
+    try:
+        await stop.wait()
+    finally:
+        # Не принимаем новые обновления, дообрабатываем начатые и только затем
+        # останавливаем диспетчер и закрываем сессию бота. Webhook в Telegram
+        # не снимается: пришедшие за время перезапуска обновления Telegram
+        # придержит и доставит после старта
+        logger.info("Остановка сервера webhook")
+        await site.stop()
+        await handler.wait_updates(WEBHOOK_SHUTDOWN_TIMEOUT)
+        await runner.cleanup()